@@ -1,10 +1,29 @@
+import asyncio
+import functools
+import heapq
+import importlib
+import inspect
+import itertools
+import json
+import math
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from concurrent.futures import Future
 from contextlib import asynccontextmanager
 from datetime import date, datetime, timedelta, timezone
-from pathlib import Path
+from urllib.parse import quote
 
-from auth import verify_cf_access_token
-from models import Exercise, Movement, User
-from database import create_db_and_tables, engine
+from auth import AuthenticatedUser, key_set, token_cache, verify_cf_access_token
+from models import DailyBest, Exercise, ExerciseArchive, Movement, ReplayedAction, SyncState, Tombstone, User
+from database import (
+    ASYNC_DATABASE, MAINTENANCE_INTERVAL, async_engine, create_db_and_tables, database_ready, engine, maintain_db,
+    next_sync_version,
+)
+from cache import MovementCatalogue, bodyweight_cache, movement_cache, onerepmax_cache, sync_caches
+from metrics import MetricsMiddleware, expose as expose_metrics
+from pages import index_pages
+from templates import Markup, Template
+from series import Period, best_per_period, downsample, moving_average as series_moving_average
+from write_queue import write_queue
 
 MIN_REPS = 1
 MAX_REPS = 20
@@ -14,21 +33,94 @@ MIN_SETS = 1
 MAX_SETS = 10
 DEFAULT_SETS = 3
 LIGHTEST_PLATE = 1.25
+GRID_REPS = list(range(MIN_REPS, MAX_REPS + 1))
+GRID_RPES = [MIN_RPE + i / 2 for i in range(2 * (MAX_RPE - MIN_RPE) + 1)]
+# Bad days at the gym when we feel weaker than usual are common.
+# To be robust against that and stimulate the user, recommendations use their
+# best performance over the past 4 sessions of a movement.
+LOOKBACK_WINDOW = 4
+# Rows fetched per round trip and bytes buffered per chunk when streaming JSON.
+STREAM_BATCH_SIZE = 500
+STREAM_CHUNK_SIZE = 64 * 1024
+# Upper bounds for /progress smoothing and downsampling parameters.
+MAX_MOVING_AVERAGE = 52
+MAX_PROGRESS_POINTS = 2000
 
-from fastapi import Depends, FastAPI, Form, Header, HTTPException, Query, Request, Response, status
+from fastapi import Body, Depends, FastAPI, Form, Header, HTTPException, Query, Response, status
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from fastapi.responses import HTMLResponse, RedirectResponse
-from sqlmodel import Session, select
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.util import await_only
+from sqlmodel import Session, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 def format(number: float) -> str:
     """Format a float to remove unnecessary trailing zeros."""
     return f'{number:g}'
 
-def format_date(date: datetime) -> str:
-    if date.year == datetime.now().year:
-        return date.strftime("%d %b")
-    return date.strftime("%d %b %y")
+def iter_json(obj: dict) -> Iterator[str]:
+    """Encode a dict as JSON incrementally.
+
+    Values that are iterators are written out as JSON arrays one item at a
+    time, so the full list never has to be held in memory. Iterators may be
+    nested, e.g. an iterator of dicts that themselves hold iterators. Output is
+    buffered into chunks of roughly STREAM_CHUNK_SIZE characters.
+    """
+    buffer: list[str] = []
+    size = 0
+
+    def write(part: str) -> Iterator[str]:
+        nonlocal size
+        buffer.append(part)
+        size += len(part)
+        if size >= STREAM_CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer.clear()
+            size = 0
+
+    def encode(value) -> Iterator[str]:
+        if isinstance(value, dict):
+            yield from write('{')
+            for i, (key, item) in enumerate(value.items()):
+                yield from write(f'{"," if i else ""}{json.dumps(key)}:')
+                yield from encode(item)
+            yield from write('}')
+        elif isinstance(value, Iterator):
+            yield from write('[')
+            for i, item in enumerate(value):
+                if i:
+                    yield from write(',')
+                yield from encode(item)
+            yield from write(']')
+        else:
+            yield from write(json.dumps(value))
+
+    yield from encode(obj)
+    if buffer:
+        yield ''.join(buffer)
+
+class JSONStreamingResponse(StreamingResponse):
+    media_type = 'application/json'
+
+    def __init__(self, obj: dict):
+        # Kept so AsyncSessionRoute can drive the iterator from the event loop.
+        self.chunks = iter_json(obj)
+        super().__init__(self.chunks)
+
+MONTH_ABBREVIATIONS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+def format_date(date: datetime, current_year: int) -> str:
+    """Format as "05 Apr", or "05 Apr 24" outside the current year.
+
+    Callers rendering many rows look up the current year once and pass it in.
+    """
+    day_month = f'{date.day:02d} {MONTH_ABBREVIATIONS[date.month - 1]}'
+    if date.year == current_year:
+        return day_month
+    return f'{day_month} {date.year % 100:02d}'
 
 def get_onerepmax(exercise: Exercise) -> float:
     '''Estimate the external 1RM (excluding bodyweight) using Brzycki's formula.
@@ -39,6 +131,45 @@ def get_onerepmax(exercise: Exercise) -> float:
     bodyweight = exercise.bodyweight if exercise.bodyweight else 0
     return (exercise.weight + bodyweight) * 36 / (37 - (exercise.reps + (10 - exercise.rpe))) - bodyweight
 
+def record_daily_bests(session: Session, exercises: list[Exercise]):
+    '''Fold new exercises' stored 1RMs into their days' DailyBest rows.'''
+    best: dict[tuple[int, str, date], float] = {}
+    for exercise in exercises:
+        key = (exercise.user_id, exercise.exercise_name, exercise.created_at.date())
+        best[key] = max(best.get(key, exercise.onerepmax), exercise.onerepmax)
+
+    statement = insert(DailyBest)
+    session.exec(
+        statement.on_conflict_do_update(
+            index_elements=['user_id', 'exercise_name', 'day'],
+            set_={'onerepmax': func.max(DailyBest.onerepmax, statement.excluded.onerepmax)},
+        ),
+        params=[
+            {'user_id': user_id, 'exercise_name': exercise_name, 'day': day, 'onerepmax': onerepmax}
+            for (user_id, exercise_name, day), onerepmax in best.items()
+        ],
+    )
+
+def refresh_daily_best(session: Session, user_id: int, exercise_name: str, day: date):
+    '''Recompute a DailyBest row from the remaining exercises, e.g. after a delete.'''
+    start = datetime.combine(day, datetime.min.time())
+    bests = [
+        session.exec(
+            select(func.max(model.onerepmax))
+            .where(model.user_id == user_id, model.exercise_name == exercise_name)
+            .where(model.created_at >= start, model.created_at < start + timedelta(days=1))
+        ).one()
+        for model in (Exercise, ExerciseArchive)
+    ]
+    best = max((best for best in bests if best is not None), default=None)
+    daily_best = session.get(DailyBest, (user_id, exercise_name, day))
+    if best is None:
+        if daily_best:
+            session.delete(daily_best)
+    elif daily_best:
+        daily_best.onerepmax = best
+        session.add(daily_best)
+
 def get_target_weight(onerepmax: float, reps: int, current_bodyweight: float | None, rpe: float) -> float:
     '''Calculate the external weight to use for a target reps/RPE.
 
@@ -51,41 +182,207 @@ def get_target_weight(onerepmax: float, reps: int, current_bodyweight: float | N
     weight = total_weight - bw
     return round(weight / LIGHTEST_PLATE) * LIGHTEST_PLATE
 
-def get_exercise_row_snippet(exercise: Exercise) -> str:
-    return f"""
+EXERCISE_ROW = Template("""
     <tr>
-        <th scope="row">{format_date(exercise.created_at)}
+        <th scope="row">{date}
             <button class="delete-btn"
-                    hx-post="/exercises/{exercise.id}/delete"
+                    hx-post="/exercises/{id}/delete"
                     hx-confirm="Delete this exercise?"
                     hx-target="#previous-exercises"
                     hx-swap="outerHTML">✕</button>
         </th>
-        <td>{exercise.exercise_name}</td>
-        <td>{exercise.sets}</td>
-        <td>{exercise.reps}</td>
-        <td>{format(exercise.weight)}</td>
-        <td>{format(exercise.rpe)}</td>
+        <td>{exercise_name}</td>
+        <td>{sets}</td>
+        <td>{reps}</td>
+        <td>{weight}</td>
+        <td>{rpe}</td>
     </tr>
-    """
+    """)
 
-def get_bodyweight_snippet(bodyweight: float) -> str:
-    return f"""
+EXERCISES_PAGE = Template("""
+    <div id="previous-exercises"
+         hx-get="/exercises"
+         hx-trigger="exercise-logged from:body"
+         hx-swap="outerHTML">
+        <div style="overflow-x: auto">
+        <table>
+            <thead>
+                <tr>
+                    <th scope="col">Date</th>
+                    <th scope="col">Movement</th>
+                    <th scope="col">Sets</th>
+                    <th scope="col">Reps</th>
+                    <th scope="col">Weight</th>
+                    <th scope="col">RPE</th>
+                </tr>
+            </thead>
+            <tbody>{rows}</tbody>
+        </table>
+        </div>
+        <div class="pagination">
+            <div>{previous_button}</div>
+            <div class="pagination-next">{next_button}</div>
+        </div>
+    </div>
+    """)
+
+PAGE_BUTTON = Template("""
+            <button hx-get="/exercises?{direction}={cursor}&limit={limit}"
+                    hx-target="#previous-exercises"
+                    hx-swap="outerHTML">{label}</button>
+        """)
+
+def get_exercise_row_snippet(exercise: Exercise, current_year: int) -> Markup:
+    return EXERCISE_ROW.render(
+        date=format_date(exercise.created_at, current_year),
+        id=exercise.id,
+        exercise_name=exercise.exercise_name,
+        sets=exercise.sets,
+        reps=exercise.reps,
+        weight=format(exercise.weight),
+        rpe=format(exercise.rpe),
+    )
+
+def iter_exercise_rows(exercises: Iterable[Exercise]) -> Iterator[Markup]:
+    current_year = datetime.now().year
+    for exercise in exercises:
+        yield get_exercise_row_snippet(exercise, current_year)
+
+FAILURE_MESSAGE = Template("""
+        <div class="failure-message">
+        <p>{message}</p>
+        </div>
+        """)
+
+SUCCESS_MESSAGE = Template("""
+    <div class="success-message">
+    <p>{message}</p>
+    </div>
+    """)
+
+MOVEMENT_OPTION = Template('<option value="{name}">{name}</option>')
+
+RECOMMENDATION_FORM = Template("""
+    <form hx-post="/exercises/"
+          hx-swap="none"
+          hx-on::after-request="if(event.detail.successful) {{ var el = this.querySelector('.rec-success'); el.innerHTML = '<div class=\\'success-message\\'>Exercise logged successfully!</div>'; setTimeout(() => el.innerHTML = '', 3000); document.body.dispatchEvent(new Event('exercise-logged')); }}">
+        <table>
+            <thead>
+                <tr>
+                    <th>Movement</th>
+                    <th>Sets</th>
+                    <th>Reps</th>
+                    <th>Weight (kg)</th>
+                    <th>RPE</th>
+                </tr>
+            </thead>
+            <tbody>
+                <tr>
+                    <td>{exercise_name}<input type="hidden" name="exercise_name" value="{exercise_name}"></td>
+                    <td>
+                        <input type="number" name="sets" value="{DEFAULT_SETS}"
+                            min="{MIN_SETS}" max="{MAX_SETS}" step="1" style="width: 4rem; margin: 0; padding: 0.25rem;">
+                    </td>
+                    <td>
+                        <input type="number" name="reps" value="{reps}"
+                            min="{MIN_REPS}" max="{MAX_REPS}" step="1" style="width: 4rem; margin: 0; padding: 0.25rem;">
+                    </td>
+                    <td>
+                        <input type="number" name="weight" value="{weight}"
+                            min="0" step="{LIGHTEST_PLATE}" style="width: 5rem; margin: 0; padding: 0.25rem;">
+                    </td>
+                    <td>
+                        <input type="number" name="rpe" value="{rpe}"
+                            min="1" max="10" step="0.5" style="width: 5rem; margin: 0; padding: 0.25rem;">
+                    </td>
+                </tr>
+            </tbody>
+        </table>
+        <div class="rec-success"></div>
+        <button type="submit">Log</button>
+    </form>
+    """,
+    DEFAULT_SETS=DEFAULT_SETS,
+    MIN_SETS=MIN_SETS,
+    MAX_SETS=MAX_SETS,
+    MIN_REPS=MIN_REPS,
+    MAX_REPS=MAX_REPS,
+    LIGHTEST_PLATE=LIGHTEST_PLATE,
+)
+
+def get_cursor(exercise: Exercise) -> str:
+    '''Keyset pagination cursor identifying an exercise's position in the history.'''
+    return f'{exercise.created_at.isoformat()},{exercise.id}'
+
+def parse_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, id = cursor.rsplit(',', 1)
+        return datetime.fromisoformat(created_at), int(id)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Invalid pagination cursor")
+
+BODYWEIGHT_DISPLAY = Template("""
     <div id="bodyweight-display">
         <p style="font-size: 0.9rem; color: var(--pico-muted-color); margin-top: 0.5rem;">
-            Current: <strong>{format(bodyweight)}</strong>
+            Current: <strong>{bodyweight}</strong>
         </p>
     </div>
-    """
+    """)
 
-def get_session():
-    with Session(engine) as session:
-        yield session
+def get_bodyweight_snippet(bodyweight: float) -> Markup:
+    return BODYWEIGHT_DISPLAY.render(bodyweight=format(bodyweight))
 
-def get_current_user(
+# Every request that touches the database first drops cached data that
+# another worker process has made stale.
+if ASYNC_DATABASE:
+    async def get_session():
+        sync_caches()
+        async with AsyncSession(async_engine) as session:
+            yield session
+else:
+    def get_session():
+        sync_caches()
+        with Session(engine) as session:
+            yield session
+
+def run_in_async_session(endpoint: Callable) -> Callable:
+    '''Adapt a sync endpoint or dependency to run over an AsyncSession.
+
+    The endpoint body is unchanged: it is called through AsyncSession.run_sync
+    with the underlying sync session, so each statement awaits aiosqlite on the
+    event loop instead of blocking a threadpool worker. Streamed JSON bodies
+    keep fetching rows through the same session while they are sent.
+    '''
+    if 'session' not in inspect.signature(endpoint).parameters or inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        session: AsyncSession = kwargs.pop('session')
+        result = await session.run_sync(lambda sync_session: endpoint(session=sync_session, **kwargs))
+        if isinstance(result, JSONStreamingResponse):
+            result.body_iterator = iterate_in_session(session, result.chunks)
+        return result
+    return wrapper
+
+async def iterate_in_session(session: AsyncSession, chunks: Iterator[str]) -> AsyncIterator[str]:
+    while (chunk := await session.run_sync(lambda _: next(chunks, None))) is not None:
+        yield chunk
+
+class AsyncSessionRoute(APIRoute):
+    '''Route class used in async database mode; see run_in_async_session.'''
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, run_in_async_session(endpoint), **kwargs)
+
+def authenticate(
     session: Session = Depends(get_session),
     cf_access_jwt_assertion: str = Header(alias="Cf-Access-Jwt-Assertion"),
-) -> User:
+) -> AuthenticatedUser:
+    # Tokens seen before skip both the signature check and the user lookup.
+    identity = token_cache.get(cf_access_jwt_assertion)
+    if identity and identity.user_id is not None:
+        return AuthenticatedUser(id=identity.user_id, email=identity.email)
+
     email = verify_cf_access_token(cf_access_jwt_assertion)
     if email is None:
         raise HTTPException(
@@ -99,14 +396,121 @@ def get_current_user(
         session.add(user)
         session.commit()
         session.refresh(user)
+    token_cache.remember_user(cf_access_jwt_assertion, user.id)
+    return AuthenticatedUser(id=user.id, email=user.email)
+
+if ASYNC_DATABASE:
+    authenticate = run_in_async_session(authenticate)
+
+def get_current_user(
+    session: Session = Depends(get_session), user: AuthenticatedUser = Depends(authenticate),
+) -> AuthenticatedUser:
+    '''The authenticated user, once their queued writes are committed.
+
+    Routes that only queue more writes depend on authenticate instead: the
+    queue applies each user's writes in order, so they needn't wait.
+    '''
+    if wait_for_pending_writes(user.id):
+        # authenticate may have loaded the row before the writes committed.
+        row = session.identity_map.get(session.identity_key(User, user.id))
+        if row is not None:
+            session.refresh(row)
     return user
 
+if ASYNC_DATABASE:
+    get_current_user = run_in_async_session(get_current_user)
+# Nothing to wait for without the write queue.
+if write_queue is None:
+    get_current_user = authenticate
+
+def get_user_bodyweight(session: Session, user_id: int) -> float:
+    # A User already loaded in this session may carry a change that isn't
+    # committed yet, e.g. from an earlier write in the same write-queue batch.
+    user = session.identity_map.get(session.identity_key(User, user_id))
+    if user is not None:
+        return user.bodyweight
+    generation = bodyweight_cache.generation
+    bodyweight = bodyweight_cache.get(user_id)
+    if bodyweight is None:
+        bodyweight = session.get(User, user_id).bodyweight
+        bodyweight_cache.fill(user_id, bodyweight, generation)
+    return bodyweight
+
+def is_admin(session: Session, user_id: int) -> bool:
+    # Read on every request rather than cached with the token, so revoking
+    # admin takes effect at once in every worker.
+    return session.get(User, user_id).is_admin
+
+def write(session: Session, user_id: int, apply: Callable[[Session], None], on_commit: Callable[[], None]) -> Future | None:
+    '''Commit a write in the request's session, or queue it in write-behind mode.
+
+    apply adds the change to a session without committing; on_commit runs once
+    it is committed. Queued writes return the writer's future.
+    '''
+    if write_queue is None:
+        apply(session)
+        session.commit()
+        on_commit()
+        return None
+    return write_queue.submit(user_id, apply, on_commit)
+
+def wait_for_write(future: Future):
+    '''Block until a queued write is committed, re-raising its error.
+
+    In async database mode this runs inside AsyncSession.run_sync, so the wait
+    is handed to the event loop instead of blocking it.
+    '''
+    if ASYNC_DATABASE:
+        await_only(asyncio.wrap_future(future))
+    else:
+        future.result()
+
+def wait_for_pending_writes(user_id: int) -> bool:
+    '''Let reads see the user's own queued writes. Returns whether any were pending.'''
+    future = write_queue and write_queue.pending(user_id)
+    if not future:
+        return False
+    try:
+        wait_for_write(future)
+    except Exception:
+        # Already reported to the request that queued it.
+        pass
+    return True
+
+async def warm_up():
+    '''Startup work that runs once the app is already serving, then periodic upkeep.'''
+    # The first key fetch gates readiness, so don't compete with it for the GIL.
+    await key_set.first_fetch()
+    # numpy is imported lazily; load it before the first request needs it.
+    await asyncio.to_thread(importlib.import_module, 'onerepmax')
+    while True:
+        try:
+            await asyncio.to_thread(maintain_db)
+        except Exception as e:
+            print(f'Database maintenance failed: {e}')
+        await asyncio.sleep(MAINTENANCE_INTERVAL.total_seconds())
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables()
+    # The first signing key fetch runs while the database is set up.
+    refresh_task = await key_set.start()
+    await asyncio.to_thread(create_db_and_tables)
+    index_pages.load()
+    warm_up_task = asyncio.create_task(warm_up())
+    if write_queue:
+        write_queue.start()
     yield
+    if write_queue:
+        await asyncio.to_thread(write_queue.stop)
+    warm_up_task.cancel()
+    refresh_task.cancel()
+    if async_engine:
+        await async_engine.dispose()
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+if ASYNC_DATABASE:
+    app.router.route_class = AsyncSessionRoute
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -122,48 +526,63 @@ def get_service_worker():
 def get_login():
     return RedirectResponse(url='/')
 
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
 @app.get('/', response_class=HTMLResponse)
-def get_root(current_user: User = Depends(get_current_user)):
-    html_path = Path(__file__).parent / 'index.html'
-    html = html_path.read_text()
-    if not current_user.is_admin:
-        import re
-        html = re.sub(
-            r'<!-- BEGIN Create Movement -->.*?<!-- END Create Movement -->',
-            '',
-            html,
-            flags=re.DOTALL,
-        )
-    return html
+def get_root(
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    accept_encoding: str = Header(default=''),
+    if_none_match: str | None = Header(default=None),
+):
+    page = index_pages.get(is_admin(session, current_user.id))
+    coding = page.negotiate(accept_encoding)
+    etag = page.etag_for(coding)
+    headers = {
+        'ETag': etag,
+        # Per-role page behind auth: browsers may keep it but must revalidate.
+        'Cache-Control': 'private, no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if coding != 'identity':
+        headers['Content-Encoding'] = coding
+    return Response(page.bodies[coding], media_type='text/html; charset=utf-8', headers=headers)
 
 @app.get('/bodyweight', response_class=HTMLResponse)
 def get_bodyweight(
     *,
     session: Session=Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthenticatedUser = Depends(get_current_user)
 ):
-    user = session.get(User, current_user.id)
-    return get_bodyweight_snippet(user.bodyweight)
+    return get_bodyweight_snippet(get_user_bodyweight(session, current_user.id))
 
 @app.put('/bodyweight', response_class=HTMLResponse)
 def put_bodyweight(
     *,
     session: Session=Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(authenticate),
     bodyweight: float = Form(...)
 ):
-    user = session.get(User, current_user.id)
-    user.bodyweight = bodyweight
-    session.add(user)
-    session.commit()
-    session.refresh(user)
-    return get_bodyweight_snippet(user.bodyweight)
+    user_id = current_user.id
+
+    def apply(session: Session):
+        user = session.get(User, user_id)
+        user.bodyweight = bodyweight
+        session.add(user)
+
+    write(session, user_id, apply, on_commit=lambda: bodyweight_cache.set(user_id, bodyweight))
+    return get_bodyweight_snippet(bodyweight)
 
 @app.post('/exercises/', response_class=HTMLResponse)
 def create_exercise(
     *,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(authenticate),
     exercise_name: str = Form(...),
     reps: int = Form(..., ge=MIN_REPS, le=MAX_REPS),
     weight: float = Form(...),
@@ -171,23 +590,29 @@ def create_exercise(
     sets: int = Form(default=DEFAULT_SETS, ge=MIN_SETS, le=MAX_SETS),
     exercise_date: date | None = Form(default=None)
 ):
-    exercise = Exercise(
-        exercise_name=exercise_name,
-        sets=sets,
-        reps=reps,
-        weight=weight,
-        rpe=rpe,
-        user_id=current_user.id
-    )
-    if exercise_date:
-        exercise.created_at = datetime.combine(exercise_date, datetime.now(timezone.utc).time(), tzinfo=timezone.utc)
-    if session.get(Movement, exercise_name).dip_belt:
-        bodyweight = session.get(User, current_user.id).bodyweight
-        exercise.bodyweight = bodyweight
+    user_id = current_user.id
+    # Stamped and validated now, even if the write is queued.
+    now = datetime.now(timezone.utc)
+    created_at = datetime.combine(exercise_date, now.time(), tzinfo=timezone.utc) if exercise_date else now
+    dip_belt = get_dip_belt(session, exercise_name)
 
-    session.add(exercise)
-    session.commit()
-    session.refresh(exercise)
+    def apply(session: Session):
+        exercise = Exercise(
+            exercise_name=exercise_name,
+            sets=sets,
+            reps=reps,
+            weight=weight,
+            rpe=rpe,
+            user_id=user_id,
+            created_at=created_at,
+        )
+        if dip_belt:
+            exercise.bodyweight = get_user_bodyweight(session, user_id)
+        exercise.onerepmax = get_onerepmax(exercise)
+        session.add(exercise)
+        record_daily_bests(session, [exercise])
+
+    write(session, user_id, apply, on_commit=lambda: onerepmax_cache.invalidate((user_id, exercise_name)))
     return "<div><p>Exercise logged</p></div>"
 
 # POST instead of DELETE because htmx 1.9 doesn't swap response bodies from DELETE requests.
@@ -195,251 +620,455 @@ def create_exercise(
 def delete_exercise(
     *,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(authenticate),
     exercise_id: int
 ):
-    exercise = session.get(Exercise, exercise_id)
-    if not exercise or exercise.user_id != current_user.id:
-        raise HTTPException(status_code=404, detail="Exercise not found")
-    session.delete(exercise)
-    session.commit()
-    return get_exercises(session=session, current_user=current_user, offset=0, limit=5)
+    user_id = current_user.id
+    deleted_names = []
+
+    def apply(session: Session):
+        exercise = session.get(Exercise, exercise_id) or session.exec(
+            select(ExerciseArchive).where(ExerciseArchive.user_id == user_id, ExerciseArchive.id == exercise_id)
+        ).first()
+        if not exercise or exercise.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Exercise not found")
+        session.delete(exercise)
+        session.flush()
+        refresh_daily_best(session, exercise.user_id, exercise.exercise_name, exercise.created_at.date())
+        deleted_names.append(exercise.exercise_name)
+
+    def on_commit():
+        onerepmax_cache.invalidate((user_id, deleted_names[-1]))
+
+    # The response lists the remaining exercises, so wait for a queued delete.
+    if future := write(session, user_id, apply, on_commit):
+        wait_for_write(future)
+    return get_exercises(session=session, current_user=current_user, offset=0, limit=5, before=None, after=None)
+
+def select_history(
+    session: Session, user_id: int, limit: int, *,
+    before: tuple[datetime, int] | None = None, after: tuple[datetime, int] | None = None, offset: int = 0,
+) -> list[Exercise | ExerciseArchive]:
+    '''Up to `limit` history rows from the hot and archive tables, merged.
+
+    Newest first, or oldest first when paging from an `after` cursor. Each
+    table answers with one index seek for offset + limit rows.
+    '''
+    rows = []
+    for model in (Exercise, ExerciseArchive):
+        key = tuple_(model.created_at, model.id)
+        query = select(model).where(model.user_id == user_id)
+        if after:
+            query = query.where(key > after).order_by(model.created_at, model.id)
+        else:
+            if before:
+                query = query.where(key < before)
+            query = query.order_by(model.created_at.desc(), model.id.desc())
+        rows += session.exec(query.limit(offset + limit)).all()
+    rows.sort(key=lambda row: (row.created_at, row.id), reverse=not after)
+    return rows[offset:offset + limit]
 
 @app.get('/exercises', response_class=HTMLResponse)
 def get_exercises(*,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     offset: int = Query(default=0, ge=0),
-    limit: int = Query(default=5, ge=1, le=20)
+    limit: int = Query(default=5, ge=1, le=20),
+    before: str | None = Query(default=None),
+    after: str | None = Query(default=None),
 ):
-    exercises = session.exec(
-        select(Exercise)
-        .where(Exercise.user_id == current_user.id)
-        .order_by(Exercise.created_at.desc())
-        .offset(offset)
-        .limit(limit + 1) # Fetch one extra row to determine if a next page exists
-    ).all()
-    table_rows = [get_exercise_row_snippet(exercise) for exercise in exercises[:limit]]
+    """Render a page of workout history.
 
-    def make_button(label:str, offset: int, limit: int) -> str:
-        return f"""
-            <button hx-get="/exercises?offset={offset}&limit={limit}"
-                    hx-target="#previous-exercises"
-                    hx-swap="outerHTML">{label}</button>
-        """
-    previous_button = make_button("Previous", max(offset - limit, 0), limit) if offset > 0 else ""
-    next_button = make_button("Next", offset + limit, limit) if len(exercises) > limit else ""
-
-    return f"""
-    <div id="previous-exercises"
-         hx-get="/exercises"
-         hx-trigger="exercise-logged from:body"
-         hx-swap="outerHTML">
-        <div style="overflow-x: auto">
-        <table>
-            <thead>
-                <tr>
-                    <th scope="col">Date</th>
-                    <th scope="col">Movement</th>
-                    <th scope="col">Sets</th>
-                    <th scope="col">Reps</th>
-                    <th scope="col">Weight</th>
-                    <th scope="col">RPE</th>
-                </tr>
-            </thead>
-            <tbody>{''.join(table_rows)}</tbody>
-        </table>
-        </div>
-        <div class="pagination">
-            <div>{previous_button}</div>
-            <div class="pagination-next">{next_button}</div>
-        </div>
-    </div>
+    Pages are addressed by keyset cursors: `before` returns the rows older
+    than the given row and `after` the rows newer than it, so any page costs
+    a single index seek per table. `offset` is still accepted from older
+    clients. Archived exercises are listed alongside the rest.
     """
+    # Rows just newer than the cursor, nearest first. If fewer than a full
+    # page remain above it, fall through and show the newest page instead.
+    newer = select_history(session, current_user.id, limit + 1, after=parse_cursor(after)) if after else []
+    if len(newer) > limit:
+        exercises = newer[:limit][::-1]
+        has_previous, has_next = True, True
+    else:
+        # Fetch one extra row to determine if a next page exists
+        if before:
+            exercises = select_history(session, current_user.id, limit + 1, before=parse_cursor(before))
+        else:
+            exercises = select_history(session, current_user.id, limit + 1, offset=offset if not after else 0)
+        has_previous = bool(before) or (offset > 0 and not after)
+        has_next = len(exercises) > limit
+        exercises = exercises[:limit]
+
+    def make_button(label:str, direction: str, exercise: Exercise, limit: int) -> Markup:
+        return PAGE_BUTTON.render(label=label, direction=direction, cursor=quote(get_cursor(exercise)), limit=limit)
+    previous_button = make_button("Previous", "after", exercises[0], limit) if has_previous and exercises else ""
+    next_button = make_button("Next", "before", exercises[-1], limit) if has_next else ""
+
+    return EXERCISES_PAGE.render(
+        rows=Markup(''.join(iter_exercise_rows(exercises))),
+        previous_button=previous_button,
+        next_button=next_button,
+    )
+
+def get_movement_catalogue(session: Session) -> MovementCatalogue:
+    '''Every movement's dip_belt flag plus the rendered /movements options.
+
+    Movements change only through create_movement and replayed
+    create_movement actions, which invalidate the cache after committing.
+    '''
+    generation = movement_cache.generation
+    catalogue = movement_cache.get()
+    if catalogue is None:
+        movements = session.exec(select(Movement).order_by(Movement.name)).all()
+        version = max((movement.version for movement in movements), default=0)
+        if movements:
+            options = ['<option value="">Select a movement</option>']
+            options.extend(MOVEMENT_OPTION.render(name=movement.name) for movement in movements)
+        else:
+            options = ['<option value="">No movements available</option>']
+        catalogue = MovementCatalogue(
+            version=version,
+            dip_belt={movement.name: movement.dip_belt for movement in movements},
+            options='\n'.join(options),
+            # Derived from the data rather than this process, so every worker
+            # and restart agrees on it.
+            etag=f'"movements-{version}-{len(movements)}"',
+        )
+        movement_cache.fill(catalogue, generation)
+    return catalogue
+
+def get_dip_belt(session: Session, exercise_name: str) -> bool:
+    '''Look up a movement's dip_belt flag in the catalogue, or raise a 404.'''
+    dip_belt = get_movement_catalogue(session).dip_belt.get(exercise_name)
+    if dip_belt is None:
+        raise HTTPException(status_code=404, detail=f"Movement \'{exercise_name}\' not found")
+    return dip_belt
 
 @app.get('/movements', response_class=HTMLResponse)
-def get_movements(*, session: Session = Depends(get_session)):
-    movements = session.exec(select(Movement)).all()
+def get_movements(*,
+    session: Session = Depends(get_session),
+    if_none_match: str | None = Header(default=None),
+):
+    catalogue = get_movement_catalogue(session)
+    headers = {
+        'ETag': catalogue.etag,
+        'Cache-Control': 'no-cache',
+    }
+    if etag_matches(if_none_match, catalogue.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return HTMLResponse(catalogue.options, headers=headers)
 
-    if not movements:
-        return '<option value="">No movements available</option>'
+def get_best_onerepmax(session: Session, user_id: int, exercise_name: str) -> tuple[float, bool]:
+    '''Return the best 1RM over the lookback window and the movement's dip_belt flag.
 
-    options = ['<option value="">Select a movement</option>']
-    for movement in movements:
-        options.append(f'<option value="{movement.name}">{movement.name}</option>')
+    Only changes when the user logs or deletes this movement, so it is cached
+    and invalidated by those writes. Raises a 404 if there is nothing to
+    recommend from.
+    '''
+    key = (user_id, exercise_name)
+    generation = onerepmax_cache.generation
+    best = onerepmax_cache.get(key)
+    if best is None:
+        onerepmaxes = []
+        # Archived sessions predate the hot table's (backdated logs aside), so
+        # they are only read when it holds fewer than a full window.
+        for model in (Exercise, ExerciseArchive):
+            onerepmaxes += session.exec(
+                select(model.onerepmax)
+                .where(model.exercise_name == exercise_name, model.user_id == user_id)
+                .order_by(model.created_at.desc())
+                .limit(LOOKBACK_WINDOW - len(onerepmaxes))
+            ).all()
+            if len(onerepmaxes) == LOOKBACK_WINDOW:
+                break
+        if not onerepmaxes:
+            raise HTTPException(
+                status_code=404,
+                detail="No previous data for this movement. Please log an exercise first to get a recommendation.",
+            )
 
-    return "\n".join(options)
+        best = (max(onerepmaxes), get_dip_belt(session, exercise_name))
+        onerepmax_cache.fill(key, best, generation)
+    return best
 
 @app.post('/recommendations', response_class=HTMLResponse)
 def get_recommendation(*,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     exercise_name: str = Form(...),
     reps: int = Form(..., ge=MIN_REPS, le=MAX_REPS),
     rpe: float = Form(..., ge=MIN_RPE, le=MAX_RPE)
 ):
-    # Bad days at the gym when we feel weaker than usual are common.
-    # To be robust against that and stimulate the user, we use their best
-    # performance over the past 4 days.
-    LOOKBACK_WINDOW = 4
-    exercises = session.exec(
-        select(Exercise)
-        .where(Exercise.exercise_name == exercise_name, Exercise.user_id == current_user.id)
-        .order_by(Exercise.created_at.desc())
-        .limit(LOOKBACK_WINDOW)
-    ).all()
-    if not exercises:
-        return """
-        <div class="failure-message">
-        <p>No previous data for this movement. Please log an exercise first to get a recommendation.</p>
-        </div>
-        """
-    onerepmax = max(get_onerepmax(exercise) for exercise in exercises)
-
-    movement = session.exec(select(Movement).where(Movement.name == exercise_name)).first()
-    if not movement:
-        return """
-        <div class="failure-message">
-        <p>Movement not found</p>
-        </div>
-        """
-    bodyweight = session.get(User, current_user.id).bodyweight if movement.dip_belt else None
+    try:
+        onerepmax, dip_belt = get_best_onerepmax(session, current_user.id, exercise_name)
+    except HTTPException as e:
+        return FAILURE_MESSAGE.render(message=e.detail)
+    bodyweight = get_user_bodyweight(session, current_user.id) if dip_belt else None
 
     weight = get_target_weight(onerepmax, reps, bodyweight, rpe)
-    return f"""
-    <form hx-post="/exercises/"
-          hx-swap="none"
-          hx-on::after-request="if(event.detail.successful) {{ var el = this.querySelector('.rec-success'); el.innerHTML = '<div class=\\'success-message\\'>Exercise logged successfully!</div>'; setTimeout(() => el.innerHTML = '', 3000); document.body.dispatchEvent(new Event('exercise-logged')); }}">
-        <table>
-            <thead>
-                <tr>
-                    <th>Movement</th>
-                    <th>Sets</th>
-                    <th>Reps</th>
-                    <th>Weight (kg)</th>
-                    <th>RPE</th>
-                </tr>
-            </thead>
-            <tbody>
-                <tr>
-                    <td>{exercise_name}<input type="hidden" name="exercise_name" value="{exercise_name}"></td>
-                    <td>
-                        <input type="number" name="sets" value="{DEFAULT_SETS}"
-                            min="{MIN_SETS}" max="{MAX_SETS}" step="1" style="width: 4rem; margin: 0; padding: 0.25rem;">
-                    </td>
-                    <td>
-                        <input type="number" name="reps" value="{reps}"
-                            min="{MIN_REPS}" max="{MAX_REPS}" step="1" style="width: 4rem; margin: 0; padding: 0.25rem;">
-                    </td>
-                    <td>
-                        <input type="number" name="weight" value="{format(weight)}"
-                            min="0" step="{LIGHTEST_PLATE}" style="width: 5rem; margin: 0; padding: 0.25rem;">
-                    </td>
-                    <td>
-                        <input type="number" name="rpe" value="{format(rpe)}"
-                            min="1" max="10" step="0.5" style="width: 5rem; margin: 0; padding: 0.25rem;">
-                    </td>
-                </tr>
-            </tbody>
-        </table>
-        <div class="rec-success"></div>
-        <button type="submit">Log</button>
-    </form>
+    return RECOMMENDATION_FORM.render(exercise_name=exercise_name, reps=reps, weight=format(weight), rpe=format(rpe))
+
+@app.get('/recommendations/grid')
+def get_recommendation_grid(*,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    exercise_name: str = Query(...),
+):
+    """Recommended weights for every reps x RPE combination.
+
+    `weights[i][j]` is the weight for `reps[i]` at `rpe[j]`, computed in one
+    vectorized pass from the same 1RM the single recommendation uses.
     """
+    from onerepmax import recommendation_grid
+
+    onerepmax, dip_belt = get_best_onerepmax(session, current_user.id, exercise_name)
+    bodyweight = get_user_bodyweight(session, current_user.id) if dip_belt else None
+    weights = recommendation_grid(onerepmax, bodyweight, GRID_REPS, GRID_RPES, LIGHTEST_PLATE)
+    return {
+        "exercise": exercise_name,
+        "onerepmax": onerepmax,
+        "reps": GRID_REPS,
+        "rpe": GRID_RPES,
+        "weights": weights.tolist(),
+    }
+
+def get_exercise_dict(exercise: Exercise) -> dict:
+    return {
+        "id": exercise.id,
+        "exercise_name": exercise.exercise_name,
+        "sets": exercise.sets,
+        "reps": exercise.reps,
+        "weight": exercise.weight,
+        "rpe": exercise.rpe,
+        "bodyweight": exercise.bodyweight,
+        "created_at": exercise.created_at.isoformat(),
+    }
 
 @app.get('/api/sync')
 def api_sync(*,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    since: int | None = Query(default=None, ge=0),
 ):
-    movements = session.exec(select(Movement)).all()
+    """Pull the user's data for the offline cache.
+
+    Without `since`, or when `since` is older than the retained tombstones,
+    everything is returned and `full` is true so the client replaces its cache.
+    Otherwise only rows changed after `since` are returned, along with the ids
+    of exercises deleted since then. Clients pass the returned `cursor` as
+    `since` on their next pull. Archived exercises are not sent; see
+    GET /api/export.
+    """
+    state = session.get(SyncState, 1)
+    full = since is None or since < state.tombstone_floor or since > state.version
+    if full:
+        since = -1
+
+    movements = session.exec(select(Movement).where(Movement.version > since)).all()
     exercises = session.exec(
         select(Exercise)
-        .where(Exercise.user_id == current_user.id)
-        .order_by(Exercise.created_at.desc())
+        .where(Exercise.user_id == current_user.id, Exercise.version > since)
+        .order_by(Exercise.version)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    deleted = [] if full else session.exec(
+        select(Tombstone.exercise_id)
+        .where(Tombstone.user_id == current_user.id, Tombstone.version > since)
     ).all()
     user = session.get(User, current_user.id)
-    return {
+
+    result = {
+        "cursor": state.version,
+        "full": full,
         "movements": [{"name": m.name, "dip_belt": m.dip_belt} for m in movements],
-        "exercises": [
-            {
-                "id": e.id,
-                "exercise_name": e.exercise_name,
-                "sets": e.sets,
-                "reps": e.reps,
-                "weight": e.weight,
-                "rpe": e.rpe,
-                "bodyweight": e.bodyweight,
-                "created_at": e.created_at.isoformat(),
-            }
-            for e in exercises
-        ],
-        "bodyweight": user.bodyweight,
+        "deleted_exercises": deleted,
     }
+    if user.version > since:
+        result["bodyweight"] = user.bodyweight
+    # Streamed last so the exercise rows are fetched and encoded while the
+    # response is being sent.
+    result["exercises"] = (get_exercise_dict(e) for e in exercises)
+    return JSONStreamingResponse(result)
+
+@app.get('/api/export')
+def api_export(*,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    """Every exercise the user has logged, archived or not, oldest first."""
+    def oldest_first(model: type[Exercise] | type[ExerciseArchive]) -> Iterable[Exercise | ExerciseArchive]:
+        return session.exec(
+            select(model)
+            .where(model.user_id == current_user.id)
+            .order_by(model.created_at, model.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+
+    exercises = heapq.merge(
+        oldest_first(Exercise), oldest_first(ExerciseArchive), key=lambda row: (row.created_at, row.id)
+    )
+    return JSONStreamingResponse({
+        "bodyweight": get_user_bodyweight(session, current_user.id),
+        "exercises": (get_exercise_dict(e) for e in exercises),
+    })
+
+def check_range(name: str, value: float, low: float, high: float) -> float:
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return value
+
+def check_finite(name: str, value: float) -> float:
+    # float() accepts "nan" and "inf", which SQLite can't store in a REAL NOT NULL column.
+    if not math.isfinite(value):
+        raise ValueError(f"{name} must be a finite number")
+    return value
 
 @app.post('/api/sync')
-async def api_sync_push(*,
-    request: Request,
+def api_sync_push(*,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    body: dict = Body(...),
 ):
-    body = await request.json()
+    """Replay actions queued by an offline client.
+
+    The batch is applied in one transaction. Movements and the user are
+    loaded once, exercises are validated as they are read and written with a
+    single bulk insert at the end. Actions carrying an `action_id` that was
+    already replayed are skipped, so retrying a batch is a no-op. Each action
+    gets a result: ok, duplicate, skipped (not permitted) or error.
+    """
     actions = body.get('actions', [])
+    if not isinstance(actions, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="actions must be a list")
+
+    # Malformed actions and ids are reported per action below.
+    action_ids = [
+        action['action_id'] for action in actions
+        if isinstance(action, dict) and action.get('action_id') and isinstance(action['action_id'], str)
+    ]
+    replayed = set(session.exec(
+        select(ReplayedAction.action_id)
+        .where(ReplayedAction.user_id == current_user.id, ReplayedAction.action_id.in_(action_ids))
+    ).all()) if action_ids else set()
+    movements = {movement.name: movement for movement in session.exec(select(Movement)).all()}
+    user = session.get(User, current_user.id)
 
+    exercises: list[Exercise] = []
+    bodyweight_updated = False
+    movements_created = False
+    new_action_ids: list[str] = []
+    results = []
     for action in actions:
-        action_type = action['type']
-        data = action['data']
-
-        if action_type == 'create_exercise':
-            movement = session.get(Movement, data['exercise_name'])
-            exercise = Exercise(
-                exercise_name=data['exercise_name'],
-                sets=int(data.get('sets', DEFAULT_SETS)),
-                reps=int(data['reps']),
-                weight=float(data['weight']),
-                rpe=float(data['rpe']),
-                user_id=current_user.id,
-            )
-            if movement and movement.dip_belt:
-                exercise.bodyweight = session.get(User, current_user.id).bodyweight
-            if 'created_at' in action:
-                exercise.created_at = datetime.fromisoformat(action['created_at'])
-            session.add(exercise)
-
-        elif action_type == 'update_bodyweight':
-            user = session.get(User, current_user.id)
-            user.bodyweight = float(data['bodyweight'])
-            session.add(user)
-
-        elif action_type == 'create_movement':
-            if not current_user.is_admin:
-                continue
-            existing = session.exec(select(Movement).where(Movement.name == data['name'])).first()
-            if not existing:
-                movement = Movement(name=data['name'], dip_belt=bool(data.get('dip_belt', False)))
-                session.add(movement)
+        action_id = action.get('action_id') if isinstance(action, dict) else None
+        if action_id and isinstance(action_id, str) and action_id in replayed:
+            results.append({"action_id": action_id, "status": "duplicate"})
+            continue
+
+        try:
+            if not isinstance(action, dict):
+                raise TypeError("action must be an object")
+            if action_id is not None and not isinstance(action_id, str):
+                raise TypeError("action_id must be a string")
+            action_type = action['type']
+            data = action['data']
+            result = "ok"
+
+            if action_type == 'create_exercise':
+                movement = movements.get(data['exercise_name'])
+                if not movement:
+                    raise ValueError(f"Movement '{data['exercise_name']}' not found")
+                exercise = Exercise(
+                    exercise_name=movement.name,
+                    sets=check_range("sets", int(data.get('sets', DEFAULT_SETS)), MIN_SETS, MAX_SETS),
+                    reps=check_range("reps", int(data['reps']), MIN_REPS, MAX_REPS),
+                    weight=check_finite("weight", float(data['weight'])),
+                    rpe=check_range("rpe", float(data['rpe']), MIN_RPE, MAX_RPE),
+                    user_id=current_user.id,
+                    bodyweight=user.bodyweight if movement.dip_belt else None,
+                )
+                if 'created_at' in action:
+                    exercise.created_at = datetime.fromisoformat(action['created_at'])
+                exercises.append(exercise)
+
+            elif action_type == 'update_bodyweight':
+                user.bodyweight = check_finite("bodyweight", float(data['bodyweight']))
+                session.add(user)
+                bodyweight_updated = True
+
+            elif action_type == 'create_movement':
+                if not isinstance(data['name'], str):
+                    raise TypeError("name must be a string")
+                if not user.is_admin:
+                    result = "skipped"
+                elif data['name'] not in movements:
+                    movement = Movement(name=data['name'], dip_belt=bool(data.get('dip_belt', False)))
+                    movements[movement.name] = movement
+                    session.add(movement)
+                    movements_created = True
 
+            else:
+                raise ValueError(f"Unknown action type '{action_type}'")
+        except (KeyError, TypeError, ValueError) as e:
+            results.append({"action_id": action_id, "status": "error", "detail": str(e)})
+            continue
+
+        if action_id:
+            replayed.add(action_id)
+            new_action_ids.append(action_id)
+        results.append({"action_id": action_id, "status": result})
+
+    if exercises:
+        from onerepmax import estimate_onerepmax
+
+        onerepmaxes = estimate_onerepmax(
+            [exercise.weight for exercise in exercises],
+            [exercise.reps for exercise in exercises],
+            [exercise.rpe for exercise in exercises],
+            [exercise.bodyweight or 0 for exercise in exercises],
+        )
+        for exercise, onerepmax in zip(exercises, onerepmaxes.tolist()):
+            exercise.onerepmax = onerepmax
+        version = next_sync_version(session)
+        session.exec(
+            # render_nulls keeps every row's parameter set identical so the
+            # whole batch goes out as one executemany.
+            insert(Exercise).execution_options(render_nulls=True),
+            params=[exercise.model_dump(exclude={'id'}) | {'version': version} for exercise in exercises],
+        )
+        record_daily_bests(session, exercises)
+    if new_action_ids:
+        session.exec(
+            insert(ReplayedAction),
+            params=[{'user_id': current_user.id, 'action_id': action_id} for action_id in new_action_ids],
+        )
     session.commit()
-    return {"status": "ok", "replayed": len(actions)}
+    for exercise in exercises:
+        onerepmax_cache.invalidate((current_user.id, exercise.exercise_name))
+    if movements_created:
+        movement_cache.invalidate()
+    if bodyweight_updated:
+        bodyweight_cache.set(user.id, user.bodyweight)
+    return {
+        "status": "ok",
+        "replayed": sum(result["status"] == "ok" for result in results),
+        "results": results,
+    }
 
 @app.post('/movements', response_class=HTMLResponse)
 def create_movement(*,
     response: Response,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     name: str = Form(...),
     dip_belt: bool = Form(default=False)
 ):
-    if not current_user.is_admin:
+    if not is_admin(session, current_user.id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
 
     movement = session.get(Movement, name)
     if movement:
-        return f"""
-        <div class="failure-message">
-        <p>Movement {name} already exists</p>
-        </div>
-        """
+        return FAILURE_MESSAGE.render(message=f"Movement {name} already exists")
 
     movement = Movement(
         name=name,
@@ -447,48 +1076,151 @@ def create_movement(*,
     )
     session.add(movement)
     session.commit()
+    movement_cache.invalidate()
 
     response.headers["HX-Trigger"] = "movement-created"
-    return f"""
-    <div class="success-message">
-    <p>Movement {name} successfully created</p>
-    </div>
-    """
+    return SUCCESS_MESSAGE.render(message=f"Movement {name} successfully created")
+
+@app.get('/healthz')
+async def get_health():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+@app.get('/readyz')
+def get_readiness(response: Response):
+    """Readiness: the database answers and the Cloudflare Access keys are loaded."""
+    checks = {"database": database_ready(), "signing_keys": key_set.loaded}
+    ready = all(checks.values())
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"status": "ready" if ready else "unavailable", **checks}
+
+@app.get('/api/stats/cache')
+def get_cache_stats(*,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    if not is_admin(session, current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return {
+        "token": token_cache.stats(),
+        "onerepmax": onerepmax_cache.stats(),
+        "bodyweight": bodyweight_cache.stats(),
+        "movements": movement_cache.stats(),
+    }
+
+@app.get('/metrics')
+def get_metrics(*,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+):
+    """Request latency, SQL and JWT verification metrics in Prometheus text format."""
+    if not is_admin(session, current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return Response(expose_metrics(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+def progress_start(days: int) -> date:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).date()
+
+def progress_points(
+    rows: Iterator[tuple[date, float]],
+    aggregate: Period,
+    moving_average: int | None,
+    points: int | None,
+) -> Iterator[dict]:
+    """Apply the /progress aggregation options to date-ordered (day, 1RM) rows."""
+    series = best_per_period(rows, aggregate)
+    if moving_average:
+        series = series_moving_average(series, moving_average)
+    if points:
+        series = iter(downsample(list(series), points))
+    return ({'date': day.isoformat(), 'value': value} for day, value in series)
 
 @app.get('/progress')
 def get_progress(*,
     session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthenticatedUser = Depends(get_current_user),
     exercise_name: str = Query(...),
-    days: int = Query(gt=0, le=365)
+    days: int | None = Query(default=None, gt=0),
+    aggregate: Period = Query(default='daily'),
+    moving_average: int | None = Query(default=None, gt=1, le=MAX_MOVING_AVERAGE),
+    points: int | None = Query(default=None, ge=3, le=MAX_PROGRESS_POINTS),
 ):
-    movement = session.get(Movement, exercise_name)
-    if not movement:
-        raise HTTPException(status_code=404, detail=f"Movement \'{exercise_name}\' not found")
+    """1RM history, optionally bucketed, smoothed and downsampled.
 
-    start_date = datetime.now(timezone.utc) - timedelta(days=days)
-    exercises = session.exec(
-        select(Exercise)
-        .where(Exercise.user_id == current_user.id)
-        .where(Exercise.exercise_name == exercise_name)
-        .where(Exercise.created_at >= start_date)
-        .order_by(Exercise.created_at)
-    ).all()
+    Omitting days returns the whole history. Steps apply in order: best per
+    week or month, a trailing moving average over that many points, then an
+    LTTB downsample to at most the requested number of points.
+    """
+    get_dip_belt(session, exercise_name)
 
-    daily_best: dict[date, float] = {}
-    for exercise in exercises:
-        day = exercise.created_at.date()
-        orm = get_onerepmax(exercise)
-        if day not in daily_best or orm > daily_best[day]:
-            daily_best[day] = orm
+    query = (
+        select(DailyBest.day, DailyBest.onerepmax)
+        .where(DailyBest.user_id == current_user.id)
+        .where(DailyBest.exercise_name == exercise_name)
+    )
+    if days is not None:
+        query = query.where(DailyBest.day >= progress_start(days))
+    rows = session.exec(query.order_by(DailyBest.day).execution_options(yield_per=STREAM_BATCH_SIZE))
 
-    return {
+    return JSONStreamingResponse({
         'exercise': exercise_name,
-        'onerepmax': [
-            {
-                'date': day.isoformat(),
-                'value': value,
-            }
-            for day, value in sorted(daily_best.items())
-        ]
-    }
+        'aggregate': aggregate,
+        'onerepmax': progress_points(rows, aggregate, moving_average, points),
+    })
+
+@app.get('/progress/series')
+def get_progress_series(*,
+    session: Session = Depends(get_session),
+    current_user: AuthenticatedUser = Depends(get_current_user),
+    exercise_name: list[str] | None = Query(default=None),
+    days: int | None = Query(default=None, gt=0),
+    aggregate: Period = Query(default='daily'),
+    moving_average: int | None = Query(default=None, gt=1, le=MAX_MOVING_AVERAGE),
+    points: int | None = Query(default=None, ge=3, le=MAX_PROGRESS_POINTS),
+):
+    """1RM history for several movements from a single query.
+
+    Takes the same options as /progress, applied to each series. Repeat
+    exercise_name to pick movements (each gets a series, possibly empty);
+    omit it for every movement the user has logged.
+    """
+    names = sorted(set(exercise_name)) if exercise_name else None
+    for name in names or ():
+        get_dip_belt(session, name)
+
+    query = (
+        select(DailyBest.exercise_name, DailyBest.day, DailyBest.onerepmax)
+        .where(DailyBest.user_id == current_user.id)
+    )
+    if names:
+        query = query.where(DailyBest.exercise_name.in_(names))
+    if days is not None:
+        query = query.where(DailyBest.day >= progress_start(days))
+    rows = session.exec(
+        query.order_by(DailyBest.exercise_name, DailyBest.day).execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+    def series_points(group) -> Iterator[dict]:
+        return progress_points(((row.day, row.onerepmax) for row in group), aggregate, moving_average, points)
+
+    def series() -> Iterator[dict]:
+        # Rows arrive grouped by movement and each group is streamed as it is
+        # reached. Requested movements without rows get an empty series.
+        groups = itertools.groupby(rows, key=lambda row: row.exercise_name)
+        if names is None:
+            for name, group in groups:
+                yield {'exercise': name, 'onerepmax': series_points(group)}
+            return
+        current = next(groups, None)
+        for name in names:
+            if current and current[0] == name:
+                yield {'exercise': name, 'onerepmax': series_points(current[1])}
+                current = next(groups, None)
+            else:
+                yield {'exercise': name, 'onerepmax': iter(())}
+
+    return JSONStreamingResponse({
+        'aggregate': aggregate,
+        'series': series(),
+    })
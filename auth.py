@@ -1,25 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
 import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from sqlalchemy.exc import MissingGreenlet
+from sqlalchemy.util import await_only
+
+from metrics import jwt_verify_duration
 
-import jwt
+if TYPE_CHECKING:
+    # PyJWT pulls in cryptography, so it is imported on first use instead:
+    # by the initial key fetch, which runs in the background at startup.
+    import jwt
 
 CF_ACCESS_TEAM_DOMAIN = os.environ["CF_ACCESS_TEAM_DOMAIN"]
 CF_ACCESS_AUD = os.environ["CF_ACCESS_AUD"]
 
-CERTS_URL = f"https://{CF_ACCESS_TEAM_DOMAIN}.cloudflareaccess.com/cdn-cgi/access/certs"
+# Can point at a file:// URL, a plain path or a local stub server to run offline.
+CERTS_URL = os.environ.get(
+    "CF_ACCESS_CERTS_URL",
+    f"https://{CF_ACCESS_TEAM_DOMAIN}.cloudflareaccess.com/cdn-cgi/access/certs",
+)
+
+TOKEN_CACHE_SIZE = 1024
+
+JWKS_REFRESH_INTERVAL = 60 * 60  # Seconds between scheduled refreshes
+JWKS_RETRY_INTERVAL = 30  # Seconds before retrying a failed refresh
+JWKS_MIN_REFRESH_INTERVAL = 60  # Floor between refreshes triggered by unknown key ids
+JWKS_FETCH_TIMEOUT = 10
+
+
+class KeySetRefresher:
+    """Keeps the Cloudflare Access signing keys in memory, refreshed in the background.
+
+    Requests only ever read the in-memory key set, so they never wait on the
+    network once the first fetch has been attempted; until then they wait for
+    it, without blocking the event loop that runs it. The key set is swapped
+    atomically when a refresh succeeds and the previous keys keep being served
+    while a refresh is in flight or after it fails. A token signed with an
+    unknown key id wakes the refresh loop early, at most once per
+    JWKS_MIN_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.refreshed_at = 0.0
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._first_fetch = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.refreshed_at > 0
+
+    def fetch(self) -> dict[str, jwt.PyJWK]:
+        import jwt
+
+        url = self.url if "://" in self.url else f"file://{os.path.abspath(self.url)}"
+        with urllib.request.urlopen(url, timeout=JWKS_FETCH_TIMEOUT) as response:
+            data = json.load(response)
+        return {key.key_id: key for key in jwt.PyJWKSet.from_dict(data).keys}
+
+    def refresh(self):
+        self._keys = self.fetch()
+        self.refreshed_at = time.monotonic()
+
+    def get_signing_key(self, kid: str) -> jwt.PyJWK | None:
+        if self._loop is None:
+            if not self._keys:
+                # Not running under the app's lifespan (e.g. a script): fetch inline.
+                self.refresh()
+        elif not self._first_fetch.is_set():
+            # Just started: the first fetch is in flight.
+            self._wait_for_first_fetch()
+        key = self._keys.get(kid)
+        if key is None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return key
+
+    def _wait_for_first_fetch(self):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # A threadpool worker: block until the loop finishes the fetch.
+            self._first_fetch.wait(JWKS_FETCH_TIMEOUT)
+            return
+        # On the event loop thread, where blocking would also stop the fetch
+        # from completing. Async database mode calls in from a greenlet that
+        # can suspend instead; anywhere else, go on without the keys.
+        waiter = self.first_fetch(JWKS_FETCH_TIMEOUT)
+        try:
+            await_only(waiter)
+        except MissingGreenlet:
+            waiter.close()
+
+    async def first_fetch(self, timeout: float | None = None):
+        """Wait until the first fetch has succeeded or failed, or for `timeout` seconds."""
+        await asyncio.to_thread(self._first_fetch.wait, timeout)
+
+    async def start(self):
+        """Start fetching the keys, then refreshing them, in the background.
+
+        Doesn't wait for the first fetch, so the app can start serving
+        meanwhile; `loaded` tells when it has succeeded.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        return asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            delay = await self._refresh()
+        finally:
+            # Also when cancelled at shutdown, so nothing waits on it forever.
+            self._first_fetch.set()
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+                # Woken by an unknown key id: rate limit forced refreshes.
+                await asyncio.sleep(max(0, self.refreshed_at + JWKS_MIN_REFRESH_INTERVAL - time.monotonic()))
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            delay = await self._refresh()
+
+    async def _refresh(self) -> float:
+        """Refresh the keys and return the delay until the next refresh."""
+        try:
+            await asyncio.to_thread(self.refresh)
+            return JWKS_REFRESH_INTERVAL
+        except Exception as e:
+            print(f'Failed to fetch Cloudflare Access keys: {e}')
+            return JWKS_RETRY_INTERVAL
 
-_jwk_client = jwt.PyJWKClient(CERTS_URL, cache_keys=True)
+
+key_set = KeySetRefresher(CERTS_URL)
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    """Who a request comes from: the user's id and email, nothing more.
+
+    Deliberately not a User row, since a token cache hit never loads one.
+    Anything else, such as bodyweight or is_admin, is read from the database.
+    """
+    id: int
+    email: str
+
+
+@dataclass
+class CachedIdentity:
+    email: str
+    exp: float
+    user_id: int | None = None
+
+
+class TokenCache:
+    """LRU cache of verified tokens, each kept until the token's `exp`.
+
+    Entries are keyed by a SHA-256 of the token so raw credentials are not
+    held in memory. The user id is filled in by the caller once the user row
+    has been looked up, so repeat requests can skip both the signature check
+    and the user lookup. Nothing that can change, like the admin flag, is
+    cached.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CachedIdentity] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> CachedIdentity | None:
+        key = self._key(token)
+        with self._lock:
+            identity = self._entries.get(key)
+            if identity is None or identity.exp <= time.time():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return identity
+
+    def put(self, token: str, email: str, exp: float):
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = CachedIdentity(email=email, exp=exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def remember_user(self, token: str, user_id: int):
+        with self._lock:
+            identity = self._entries.get(self._key(token))
+            if identity is not None:
+                identity.user_id = user_id
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 
 def verify_cf_access_token(token: str) -> str | None:
     """Verify a Cloudflare Access JWT and return the user's email."""
+    import jwt
+
+    start = time.perf_counter()
     try:
-        signing_key = _jwk_client.get_signing_key_from_jwt(token)
+        signing_key = key_set.get_signing_key(jwt.get_unverified_header(token)["kid"])
+        if signing_key is None:
+            return None
         payload = jwt.decode(
             token,
             signing_key,
             algorithms=["RS256"],
             audience=CF_ACCESS_AUD,
         )
-        return payload.get("email")
+        email = payload.get("email")
+        if email is not None and "exp" in payload:
+            token_cache.put(token, email, payload["exp"])
+        return email
     except Exception:
         return None
+    finally:
+        jwt_verify_duration.observe(time.perf_counter() - start)
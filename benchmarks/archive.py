@@ -0,0 +1,124 @@
+"""Measure the hot exercise table and the main endpoints before and after archiving.
+
+Seeds a scratch database with --days of history for --users users, times
+logging an exercise, the first history page, a full /api/sync pull and
+/api/export, then moves everything older than --horizon days into the archive
+table and repeats. Also reports the on-disk size of the exercise table and
+its indexes (from SQLite's dbstat) and how long the archive run took.
+
+    python benchmarks/archive.py --users 50 --days 730 --horizon 90
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'database.db')
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+
+import app as workout_app
+from database import archive_exercises, create_db_and_tables, engine
+from models import Exercise, User
+
+MOVEMENTS = ('Squat', 'Bench press', 'Pull-up', 'Dip')
+
+def fake_verify(token: str) -> str:
+    return token
+
+def seed(users: int, days: int, per_day: int):
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{'email': f'user{i}@example.com'} for i in range(users)])
+        for user_id in range(1, users + 1):
+            rows = []
+            for day in range(days, 0, -1):
+                for i in range(per_day):
+                    reps, weight, rpe = rng.randint(3, 8), rng.uniform(40, 140), rng.choice((7, 7.5, 8, 8.5, 9))
+                    rows.append({
+                        'user_id': user_id, 'exercise_name': MOVEMENTS[i % len(MOVEMENTS)],
+                        'sets': 3, 'reps': reps, 'weight': weight, 'rpe': rpe, 'bodyweight': None,
+                        'onerepmax': weight * 36 / (37 - (reps + (10 - rpe))),
+                        'created_at': now - timedelta(days=day, minutes=i),
+                    })
+            connection.execute(insert(Exercise), rows)
+        # Same aggregation the app maintains on every write.
+        connection.exec_driver_sql('''
+            INSERT INTO dailybest (user_id, exercise_name, day, onerepmax)
+            SELECT user_id, exercise_name, date(created_at), MAX(onerepmax)
+            FROM exercise GROUP BY user_id, exercise_name, date(created_at)
+        ''')
+
+def table_sizes() -> dict[str, int]:
+    """Bytes used by each table and index."""
+    with engine.connect() as connection:
+        return dict(connection.exec_driver_sql('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').all())
+
+def exercise_bytes(sizes: dict[str, int]) -> int:
+    return sum(size for name, size in sizes.items() if name == 'exercise' or name.startswith('ix_exercise_'))
+
+def timed(request, repeat: int) -> float:
+    """Median milliseconds per call."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = request()
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return statistics.median(samples) * 1000
+
+def measure(client: TestClient, users: int, repeat: int) -> dict[str, float]:
+    headers = [{'Cf-Access-Jwt-Assertion': f'user{i}@example.com'} for i in range(users)]
+    user = headers[0]
+    return {
+        'log exercise': timed(lambda: client.post('/exercises/', headers=headers[random.randrange(users)], data={
+            'exercise_name': 'Squat', 'reps': 5, 'weight': 100, 'rpe': 8,
+        }), repeat),
+        'history page': timed(lambda: client.get('/exercises', headers=user), repeat),
+        'progress': timed(lambda: client.get('/progress?exercise_name=Squat&days=3650', headers=user), repeat),
+        'full sync': timed(lambda: client.get('/api/sync', headers=user), repeat),
+        'export': timed(lambda: client.get('/api/export', headers=user), repeat),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--days', type=int, default=730, help='Days of history per user')
+    parser.add_argument('--per-day', type=int, default=4, help='Exercises logged per user per day')
+    parser.add_argument('--horizon', type=int, default=90, help='Archive exercises older than this many days')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workout_app.verify_cf_access_token = fake_verify
+    engine.echo = False
+    create_db_and_tables()
+    seed(args.users, args.days, args.per_day)
+
+    with TestClient(workout_app.app) as client:
+        before_sizes, before = table_sizes(), measure(client, args.users, args.repeat)
+        start = time.perf_counter()
+        moved = archive_exercises(timedelta(days=args.horizon))
+        elapsed = time.perf_counter() - start
+        after_sizes, after = table_sizes(), measure(client, args.users, args.repeat)
+
+    print(f'Archived {moved} exercises in {elapsed:.2f} s')
+    print(f'{"":<16} {"before":>10} {"after":>10}')
+    print(f'{"hot table MiB":<16} {exercise_bytes(before_sizes) / 2**20:10.1f} {exercise_bytes(after_sizes) / 2**20:10.1f}')
+    print(f'{"archive MiB":<16} {"":>10} {after_sizes.get("exercisearchive", 0) / 2**20:10.1f}')
+    for name in before:
+        print(f'{name + " ms":<16} {before[name]:10.2f} {after[name]:10.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Fail if any query issued by the API falls back to a table scan or a sort.
+
+Drives every endpoint against a throwaway database, records the SQL each one
+runs, and checks the EXPLAIN QUERY PLAN of every statement with a WHERE or
+ORDER BY clause. Exits with status 1 if a plan scans a table (other than the
+ones listed in ALLOWED_SCANS) or builds a temporary B-tree to sort.
+
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'database.db')
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import app as workout_app
+from database import archive_exercises, engine
+
+# The movement catalogue is small and is always listed in full.
+ALLOWED_SCANS = {'movement'}
+
+def fake_verify(token: str) -> str:
+    return token
+
+def exercise_endpoints(client: TestClient):
+    user = {'Cf-Access-Jwt-Assertion': 'user@example.com'}
+    for i in range(30):
+        client.post('/exercises/', headers=user, data={
+            'exercise_name': 'Squat' if i % 2 else 'Dip',
+            'reps': 5, 'weight': 100 + i, 'rpe': 8,
+            'exercise_date': f'2026-01-{i % 28 + 1:02d}',
+        })
+    client.get('/', headers=user)
+    client.get('/bodyweight', headers=user)
+    client.put('/bodyweight', headers=user, data={'bodyweight': 80})
+    client.get('/movements', headers=user)
+    client.get('/exercises', headers=user)
+    client.get('/exercises?offset=10&limit=5', headers=user)
+    client.get('/exercises?before=2026-01-15T00:00:00,15&limit=5', headers=user)
+    client.get('/exercises?after=2026-01-05T00:00:00,5&limit=5', headers=user)
+    client.post('/recommendations', headers=user, data={'exercise_name': 'Squat', 'reps': 5, 'rpe': 8})
+    client.get('/progress?exercise_name=Squat&days=365', headers=user)
+    client.get('/progress?exercise_name=Squat', headers=user)
+    client.get('/progress/series?exercise_name=Squat&exercise_name=Dip&days=365', headers=user)
+    client.get('/progress/series', headers=user)
+    cursor = client.get('/api/sync', headers=user).json()['cursor']
+    client.post('/exercises/1/delete', headers=user)
+    client.get(f'/api/sync?since={cursor}', headers=user)
+    client.post('/api/sync', headers=user, json={'actions': [
+        {'type': 'create_exercise', 'data': {'exercise_name': 'Squat', 'reps': 5, 'weight': 100, 'rpe': 8}},
+        {'type': 'update_bodyweight', 'data': {'bodyweight': 81}},
+    ]})
+
+def archive_endpoints(client: TestClient):
+    """The reads that span the archive table, after moving January into it."""
+    user = {'Cf-Access-Jwt-Assertion': 'user@example.com'}
+    archive_exercises(timedelta(days=30))
+    client.get('/exercises', headers=user)
+    client.get('/exercises?offset=10&limit=5', headers=user)
+    client.get('/exercises?before=2026-01-15T00:00:00,15&limit=5', headers=user)
+    client.get('/exercises?after=2026-01-05T00:00:00,5&limit=5', headers=user)
+    client.post('/recommendations', headers=user, data={'exercise_name': 'Dip', 'reps': 5, 'rpe': 8})
+    client.post('/exercises/2/delete', headers=user)
+    client.get('/api/export', headers=user)
+
+def main() -> int:
+    statements: dict[str, tuple] = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and ('WHERE' in statement or 'ORDER BY' in statement):
+            statements.setdefault(statement, parameters)
+
+    workout_app.verify_cf_access_token = fake_verify
+    engine.echo = False
+    with TestClient(workout_app.app) as client:
+        event.listen(engine, 'before_cursor_execute', record)
+        exercise_endpoints(client)
+        archive_endpoints(client)
+        event.remove(engine, 'before_cursor_execute', record)
+
+    failures = []
+    with engine.connect() as connection:
+        for statement, parameters in statements.items():
+            plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+            details = [row[-1] for row in plan]
+            for detail in details:
+                scanned = detail.startswith('SCAN ') and detail.split()[1] not in ALLOWED_SCANS
+                if scanned or 'TEMP B-TREE' in detail:
+                    failures.append((statement, details))
+                    break
+
+    for statement, details in failures:
+        print(' '.join(statement.split()))
+        for detail in details:
+            print(f'    {detail}')
+        print()
+    print(f'{len(statements)} queries checked, {len(failures)} regressed')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
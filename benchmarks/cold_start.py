@@ -0,0 +1,104 @@
+"""Measure how long a fresh uvicorn process takes to become ready.
+
+Starts `uvicorn app:app` repeatedly against a scratch database and times,
+from process start, the first successful GET /healthz (the app is serving)
+and the first 200 from GET /readyz (the database answers and the Cloudflare
+Access signing keys are loaded). The keys are served from a local JWKS file
+so the network doesn't skew the numbers.
+
+The first run creates and seeds the database; the rest are container
+restarts against an existing one. Fails if the median restart takes longer
+than --target seconds to become ready.
+
+    python benchmarks/cold_start.py --runs 5 --target 1.0
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def write_jwks(path: Path):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(key.public_key()))
+    path.write_text(json.dumps({'keys': [{**jwk, 'kid': 'benchmark', 'alg': 'RS256', 'use': 'sig'}]}))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def status(url: str) -> int | None:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+def start_once(env: dict, timeout: float) -> tuple[float, float]:
+    """Seconds from process start until /healthz answers and until /readyz is 200."""
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        serving = None
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                sys.exit(f'uvicorn exited with code {server.returncode}')
+            if serving is None and status(f'http://127.0.0.1:{port}/healthz') == 200:
+                serving = time.perf_counter() - start
+            if serving is not None and status(f'http://127.0.0.1:{port}/readyz') == 200:
+                return serving, time.perf_counter() - start
+            time.sleep(0.005)
+        sys.exit(f'Not ready after {timeout:.0f} s')
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Restarts against the existing database')
+    parser.add_argument('--target', type=float, default=1.0, help='Maximum median restart time in seconds')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    scratch = Path(tempfile.mkdtemp())
+    write_jwks(scratch / 'certs.json')
+    env = {
+        **os.environ,
+        'DATABASE_FILE': str(scratch / 'database.db'),
+        'CF_ACCESS_TEAM_DOMAIN': os.environ.get('CF_ACCESS_TEAM_DOMAIN', 'benchmark'),
+        'CF_ACCESS_AUD': os.environ.get('CF_ACCESS_AUD', 'benchmark'),
+        'CF_ACCESS_CERTS_URL': str(scratch / 'certs.json'),
+    }
+
+    serving, ready = start_once(env, args.timeout)
+    print(f'new database:      serving {serving * 1000:6.0f} ms, ready {ready * 1000:6.0f} ms')
+    restarts = [start_once(env, args.timeout) for _ in range(args.runs)]
+    serving = statistics.median(run[0] for run in restarts)
+    ready = statistics.median(run[1] for run in restarts)
+    print(f'existing database: serving {serving * 1000:6.0f} ms, ready {ready * 1000:6.0f} ms '
+          f'(median of {args.runs}, slowest ready {max(run[1] for run in restarts) * 1000:.0f} ms)')
+    if ready > args.target:
+        sys.exit(f'Median restart took {ready:.2f} s to become ready, over the {args.target:.2f} s target')
+    print(f'Within the {args.target:.2f} s target')
+
+if __name__ == '__main__':
+    main()
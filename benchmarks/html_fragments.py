@@ -0,0 +1,124 @@
+"""Compare precompiled fragment templates with the previous f-string rendering.
+
+Renders a 20-row /exercises page and the full history table both ways. The
+f-string baseline mirrors the old code, including a datetime.now() call per
+row; the template path looks up the current year once per page. The full
+history is also rendered with Template.stream, which emits row by row.
+
+    python benchmarks/html_fragments.py --history 10000 --pages 2000
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+
+from app import EXERCISES_PAGE, format, iter_exercise_rows
+from models import Exercise
+from templates import Markup
+
+def legacy_format_date(date: datetime) -> str:
+    if date.year == datetime.now().year:
+        return date.strftime("%d %b")
+    return date.strftime("%d %b %y")
+
+def legacy_row(exercise: Exercise) -> str:
+    return f"""
+    <tr>
+        <th scope="row">{legacy_format_date(exercise.created_at)}
+            <button class="delete-btn"
+                    hx-post="/exercises/{exercise.id}/delete"
+                    hx-confirm="Delete this exercise?"
+                    hx-target="#previous-exercises"
+                    hx-swap="outerHTML">✕</button>
+        </th>
+        <td>{exercise.exercise_name}</td>
+        <td>{exercise.sets}</td>
+        <td>{exercise.reps}</td>
+        <td>{format(exercise.weight)}</td>
+        <td>{format(exercise.rpe)}</td>
+    </tr>
+    """
+
+def legacy_page(exercises: list[Exercise]) -> str:
+    table_rows = [legacy_row(exercise) for exercise in exercises]
+    return f"""
+    <div id="previous-exercises"
+         hx-get="/exercises"
+         hx-trigger="exercise-logged from:body"
+         hx-swap="outerHTML">
+        <div style="overflow-x: auto">
+        <table>
+            <thead>
+                <tr>
+                    <th scope="col">Date</th>
+                    <th scope="col">Movement</th>
+                    <th scope="col">Sets</th>
+                    <th scope="col">Reps</th>
+                    <th scope="col">Weight</th>
+                    <th scope="col">RPE</th>
+                </tr>
+            </thead>
+            <tbody>{''.join(table_rows)}</tbody>
+        </table>
+        </div>
+        <div class="pagination">
+            <div></div>
+            <div class="pagination-next"></div>
+        </div>
+    </div>
+    """
+
+def template_page(exercises: list[Exercise]) -> str:
+    return EXERCISES_PAGE.render(
+        rows=Markup(''.join(iter_exercise_rows(exercises))), previous_button='', next_button='')
+
+def streamed_page(exercises: list[Exercise]) -> int:
+    # Consumed chunk by chunk as a StreamingResponse would; returns the largest chunk.
+    return max(len(chunk) for chunk in EXERCISES_PAGE.stream(
+        rows=iter_exercise_rows(exercises), previous_button='', next_button=''))
+
+def timed(function, number: int) -> float:
+    # Best of five runs, per call.
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=10_000, help='Exercises in the full history')
+    parser.add_argument('--pages', type=int, default=2000, help='Times to render the 20-row page')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    now = datetime.now()
+    exercises = [
+        Exercise(
+            id=i, user_id=1, exercise_name=rng.choice(['Squat', 'Bench press', 'Pull-up', 'Dip']),
+            sets=3, reps=rng.randint(1, 20), weight=rng.randint(0, 600) * 0.25, rpe=rng.randint(12, 20) / 2,
+            created_at=now - timedelta(days=i / 3),
+        )
+        for i in range(args.history)
+    ]
+    page = exercises[:20]
+    assert ' '.join(legacy_page(page).split()) == ' '.join(template_page(page).split())
+
+    legacy = timed(lambda: legacy_page(page), args.pages)
+    template = timed(lambda: template_page(page), args.pages)
+    print(f'20-row page: f-string {legacy * 1e6:.0f} us, template {template * 1e6:.0f} us '
+          f'({legacy / template:.1f}x)')
+
+    legacy = timed(lambda: legacy_page(exercises), 3)
+    template = timed(lambda: template_page(exercises), 3)
+    streamed = timed(lambda: streamed_page(exercises), 3)
+    chunk = streamed_page(exercises)
+    print(f'{args.history}-row history: f-string {legacy * 1000:.1f} ms, template {template * 1000:.1f} ms '
+          f'({legacy / template:.1f}x), streamed {streamed * 1000:.1f} ms '
+          f'(largest chunk {chunk} chars vs {len(template_page(exercises))} joined)')
+
+if __name__ == '__main__':
+    main()
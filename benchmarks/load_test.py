@@ -0,0 +1,250 @@
+"""Load-test the API end to end against a seeded scratch database.
+
+Seeds users with a history of exercises, stubs Cloudflare Access so tokens
+are just email addresses, and drives the real ASGI app in-process through
+each endpoint with a fixed number of concurrent clients. Reports p50/p95/p99
+latency, throughput and peak RSS per endpoint, saves the results as JSON and
+optionally compares them with an earlier run.
+
+    python benchmarks/load_test.py --users 20 --exercises 2000 --requests 500 --concurrency 8
+    python benchmarks/load_test.py --compare benchmarks/results/20260101-120000.json
+
+Runs are reproducible for a given --seed; set DATABASE_ASYNC or
+DATABASE_PROFILE as usual to load-test other configurations.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+SCRATCH = tempfile.mkdtemp()
+os.environ['DATABASE_FILE'] = os.path.join(SCRATCH, 'database.db')
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+# No signing keys are needed: token verification is stubbed below.
+os.environ['CF_ACCESS_CERTS_URL'] = os.path.join(SCRATCH, 'certs.json')
+Path(os.environ['CF_ACCESS_CERTS_URL']).write_text('{"keys": []}')
+
+import httpx
+from sqlalchemy import insert
+
+import app as workout_app
+from auth import token_cache
+from database import backfill_db, create_db_and_tables, engine, next_sync_version
+from models import Exercise, User
+from onerepmax import estimate_onerepmax
+from sqlmodel import Session
+
+MOVEMENTS = ('Squat', 'Bench press', 'Pull-up', 'Dip')
+
+def fake_verify(token: str) -> str:
+    # Cache the identity like a successful verification would.
+    token_cache.put(token, token, time.time() + 24 * 60 * 60)
+    return token
+
+def seed(users: int, exercises: int, rng: random.Random):
+    """Create users with `exercises` logged exercises each, one per day."""
+    create_db_and_tables()
+    now = datetime.now(timezone.utc)
+    with Session(engine) as session:
+        session.add_all(User(email=f'user{i}@example.com', bodyweight=75.0) for i in range(users))
+        session.commit()
+        version = next_sync_version(session)
+        for user_id in range(1, users + 1):
+            rows = []
+            for i in range(exercises):
+                name = MOVEMENTS[i % len(MOVEMENTS)]
+                rows.append({
+                    'exercise_name': name, 'sets': 3, 'reps': rng.randint(3, 12),
+                    'weight': rng.randint(40, 120) * 1.25, 'rpe': rng.randint(14, 20) / 2,
+                    'bodyweight': 75.0 if name in ('Pull-up', 'Dip') else None,
+                    'user_id': user_id, 'version': version,
+                    'created_at': now - timedelta(days=(exercises - i) / 2),
+                })
+            onerepmaxes = estimate_onerepmax(
+                [row['weight'] for row in rows], [row['reps'] for row in rows],
+                [row['rpe'] for row in rows], [row['bodyweight'] or 0 for row in rows],
+            )
+            for row, onerepmax in zip(rows, onerepmaxes.tolist()):
+                row['onerepmax'] = onerepmax
+            session.connection().execute(insert(Exercise), rows)
+        session.commit()
+    backfill_db({'dailybest'})
+
+@dataclass
+class Scenario:
+    name: str
+    # (rng, user email) -> keyword arguments for httpx.AsyncClient.request
+    make_request: Callable[[random.Random, str], dict]
+
+def scenarios(args) -> tuple[list[Scenario], dict[str, str]]:
+    """The endpoints to load, plus each user's sync cursor for delta pulls."""
+    cursors: dict[str, str] = {}
+
+    def sync_actions(rng: random.Random, email: str) -> dict:
+        actions = [{
+            'action_id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'type': 'create_exercise',
+            'data': {'exercise_name': rng.choice(MOVEMENTS), 'reps': 5, 'weight': 100, 'rpe': 8},
+        } for _ in range(args.batch)]
+        return {'method': 'POST', 'url': '/api/sync', 'json': {'actions': actions}}
+
+    return [
+        Scenario('GET /exercises', lambda rng, email: {'method': 'GET', 'url': '/exercises?limit=20'}),
+        Scenario('POST /recommendations', lambda rng, email: {
+            'method': 'POST', 'url': '/recommendations',
+            'data': {'exercise_name': rng.choice(MOVEMENTS), 'reps': rng.randint(1, 12), 'rpe': 8},
+        }),
+        Scenario('GET /progress', lambda rng, email: {
+            'method': 'GET', 'url': f'/progress?exercise_name={rng.choice(MOVEMENTS)}&days=365',
+        }),
+        Scenario('GET /api/sync (full)', lambda rng, email: {'method': 'GET', 'url': '/api/sync'}),
+        Scenario('GET /api/sync (delta)', lambda rng, email: {
+            'method': 'GET', 'url': f'/api/sync?since={cursors.get(email, "0")}',
+        }),
+        Scenario('POST /api/sync', sync_actions),
+    ], cursors
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, args, rng: random.Random) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    remaining = args.requests
+    # Draw every request up front so the sequence depends only on the seed.
+    emails = [f'user{rng.randrange(args.users)}@example.com' for _ in range(args.requests)]
+    requests = [(email, scenario.make_request(rng, email)) for email in emails]
+
+    async def client_loop():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            email, request = requests[remaining]
+            start = time.perf_counter()
+            response = await client.request(**request, headers={'Cf-Access-Jwt-Assertion': email})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': quantiles[49] * 1000,
+        'p95_ms': quantiles[94] * 1000,
+        'p99_ms': quantiles[98] * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'throughput_rps': len(latencies) / elapsed,
+        # ru_maxrss is in KiB on Linux; it is the high-water mark so far.
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    seed_start = time.perf_counter()
+    seed(args.users, args.exercises, rng)
+    print(f'Seeded {args.users} users x {args.exercises} exercises in {time.perf_counter() - seed_start:.1f} s')
+
+    workout_app.verify_cf_access_token = fake_verify
+    # Lock waits under concurrent writes would otherwise flood the output.
+    logging.getLogger('metrics').setLevel(logging.ERROR)
+    results = {}
+    transport = httpx.ASGITransport(app=workout_app.app)
+    async with workout_app.app.router.lifespan_context(workout_app.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+            selected, cursors = scenarios(args)
+            for user in range(args.users):
+                email = f'user{user}@example.com'
+                response = await client.get('/api/sync', headers={'Cf-Access-Jwt-Assertion': email})
+                cursors[email] = response.json()['cursor']
+            for scenario in selected:
+                if args.only and scenario.name not in args.only:
+                    continue
+                # Warm caches and connections so the first requests don't skew p99.
+                warmup = argparse.Namespace(**{**vars(args), 'requests': args.warmup})
+                if args.warmup:
+                    await run_scenario(client, scenario, warmup, random.Random(args.seed))
+                results[scenario.name] = await run_scenario(client, scenario, args, rng)
+                print_row(scenario.name, results[scenario.name])
+    return results
+
+def print_row(name: str, result: dict, baseline: dict | None = None):
+    row = (f'{name:<24} {result["p50_ms"]:8.2f} {result["p95_ms"]:8.2f} {result["p99_ms"]:8.2f} '
+           f'{result["throughput_rps"]:9.1f} {result["peak_rss_mb"]:8.1f} {result["errors"]:6d}')
+    if baseline:
+        change = lambda key: (result[key] - baseline[key]) / baseline[key] * 100 if baseline[key] else 0.0
+        row += f'   p50 {change("p50_ms"):+.0f}%  p99 {change("p99_ms"):+.0f}%  rps {change("throughput_rps"):+.0f}%'
+    print(row)
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--exercises', type=int, default=2000, help='Exercises per user')
+    parser.add_argument('--requests', type=int, default=500, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--batch', type=int, default=10, help='Actions per POST /api/sync')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', help='Endpoints to run, e.g. "GET /progress"')
+    parser.add_argument('--output', type=Path, help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', type=Path, help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    print(f'{"endpoint":<24} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>9} {"RSS MB":>8} {"errors":>6}')
+    results = asyncio.run(run(args))
+
+    report = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'config': {
+            'database_async': os.environ.get('DATABASE_ASYNC', ''),
+            'database_profile': os.environ.get('DATABASE_PROFILE', 'performance'),
+        },
+        'args': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results,
+    }
+    output = args.output or RESULTS_DIR / f'{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'Saved {output}')
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        print(f'\nCompared with {args.compare} ({baseline.get("revision")}):')
+        for name, result in results.items():
+            if name in baseline['results']:
+                print_row(name, result, baseline['results'][name])
+
+if __name__ == '__main__':
+    main()
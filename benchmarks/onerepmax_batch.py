@@ -0,0 +1,68 @@
+"""Compare the scalar 1RM/target-weight functions with the vectorized engine.
+
+Times two workloads both ways: estimating 1RMs over a long exercise history,
+and building the full reps x RPE recommendation grid.
+
+    python benchmarks/onerepmax_batch.py --history 100000 --grids 1000
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+
+from app import GRID_REPS, GRID_RPES, LIGHTEST_PLATE, get_onerepmax, get_target_weight
+from models import Exercise
+from onerepmax import estimate_onerepmax, recommendation_grid
+
+def timed(function) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=100_000, help='Exercises to estimate 1RMs for')
+    parser.add_argument('--grids', type=int, default=1000, help='Recommendation grids to build')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    weight = rng.uniform(0, 150, args.history).round(2)
+    reps = rng.integers(1, 21, args.history)
+    rpe = rng.choice(GRID_RPES, args.history)
+    bodyweight = np.where(rng.random(args.history) < 0.3, 75.0, 0.0)
+    exercises = [
+        Exercise(exercise_name='Squat', weight=w, reps=r, rpe=p, bodyweight=b or None, user_id=1)
+        for w, r, p, b in zip(weight.tolist(), reps.tolist(), rpe.tolist(), bodyweight.tolist())
+    ]
+
+    scalar, expected = timed(lambda: [get_onerepmax(exercise) for exercise in exercises])
+    vector, actual = timed(lambda: estimate_onerepmax(weight, reps, rpe, bodyweight))
+    assert np.allclose(expected, actual)
+    print(f'1RM over {args.history} exercises: scalar {scalar * 1000:.1f} ms, '
+          f'vectorized {vector * 1000:.1f} ms ({scalar / vector:.0f}x)')
+
+    def scalar_grids():
+        return [
+            [[get_target_weight(100.0, r, 75.0, p) for p in GRID_RPES] for r in GRID_REPS]
+            for _ in range(args.grids)
+        ]
+
+    def vector_grids():
+        return [recommendation_grid(100.0, 75.0, GRID_REPS, GRID_RPES, LIGHTEST_PLATE) for _ in range(args.grids)]
+
+    scalar, expected = timed(scalar_grids)
+    vector, actual = timed(vector_grids)
+    assert np.allclose(expected[0], actual[0])
+    cells = len(GRID_REPS) * len(GRID_RPES)
+    print(f'{args.grids} grids of {cells} targets: scalar {scalar * 1000:.1f} ms, '
+          f'vectorized {vector * 1000:.1f} ms ({scalar / vector:.0f}x)')
+
+if __name__ == '__main__':
+    main()
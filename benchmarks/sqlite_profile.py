@@ -0,0 +1,105 @@
+"""Compare concurrent read/write throughput of the SQLite connection profiles.
+
+For each profile, runs reader threads (the history-page query) and writer
+threads (logging an exercise and committing) against a fresh database for a
+fixed duration, then reports operations per second and lock errors.
+
+    python benchmarks/sqlite_profile.py --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DATABASE_FILE', os.path.join(tempfile.mkdtemp(), 'database.db'))
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, select
+
+from database import create_db_engine
+from models import Exercise, Movement, SyncState, User
+
+def seed(engine, users: int, exercises_per_user: int):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(SyncState())
+        session.commit()
+        session.add(Movement(name='Squat'))
+        session.add_all(User(email=f'user{i}@example.com') for i in range(users))
+        session.commit()
+        session.add_all(
+            Exercise(exercise_name='Squat', reps=5, weight=100, rpe=8, user_id=user_id, bodyweight=None)
+            for user_id in range(1, users + 1)
+            for _ in range(exercises_per_user)
+        )
+        session.commit()
+
+def run(profile: str, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), f'{profile}.db')
+    engine = create_db_engine(f'sqlite:///{path}', profile=profile)
+    seed(engine, args.users, args.exercises)
+
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def count(key: str):
+        with lock:
+            counts[key] += 1
+
+    def reader(n: int):
+        user_id = n % args.users + 1
+        while time.monotonic() < deadline:
+            try:
+                with Session(engine) as session:
+                    session.exec(
+                        select(Exercise)
+                        .where(Exercise.user_id == user_id)
+                        .order_by(Exercise.created_at.desc())
+                        .limit(6)
+                    ).all()
+                count('reads')
+            except OperationalError:
+                count('errors')
+
+    def writer(n: int):
+        user_id = n % args.users + 1
+        while time.monotonic() < deadline:
+            try:
+                with Session(engine) as session:
+                    session.add(Exercise(exercise_name='Squat', reps=5, weight=100, rpe=8, user_id=user_id, bodyweight=None))
+                    session.commit()
+                count('writes')
+            except OperationalError:
+                count('errors')
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--exercises', type=int, default=500, help='Exercises seeded per user')
+    args = parser.parse_args()
+
+    print(f'{"profile":<12} {"reads/s":>10} {"writes/s":>10} {"errors":>8}')
+    for profile in ('default', 'performance'):
+        counts = run(profile, args)
+        print(f'{profile:<12} {counts["reads"] / args.seconds:>10.0f} '
+              f'{counts["writes"] / args.seconds:>10.0f} {counts["errors"]:>8}')
+
+if __name__ == '__main__':
+    main()
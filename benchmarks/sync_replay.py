@@ -0,0 +1,75 @@
+"""Benchmark replaying a large offline queue through POST /api/sync.
+
+Sends one batch of queued actions (mostly logged exercises, with the odd
+bodyweight update) through the real ASGI app against a scratch database,
+then sends the same batch again to measure the deduplicated retry. Reports
+wall time and the number of SQL statements for each.
+
+    python benchmarks/sync_replay.py --actions 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.chdir(ROOT)
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'database.db')
+os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import app as workout_app
+from database import engine
+
+def make_actions(count: int) -> list[dict]:
+    start = datetime.now(timezone.utc) - timedelta(days=count)
+    actions = []
+    for i in range(count):
+        if i % 50 == 0:
+            action = {'type': 'update_bodyweight', 'data': {'bodyweight': 70 + i % 5}}
+        else:
+            action = {'type': 'create_exercise', 'data': {
+                'exercise_name': ('Squat', 'Bench press', 'Pull-up', 'Dip')[i % 4],
+                'reps': 5, 'weight': 60 + i % 40, 'rpe': 8,
+            }}
+        action['action_id'] = str(uuid.uuid4())
+        action['created_at'] = (start + timedelta(hours=i)).isoformat()
+        actions.append(action)
+    return actions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--actions', type=int, default=5000)
+    args = parser.parse_args()
+
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    workout_app.verify_cf_access_token = lambda token: token
+    headers = {'Cf-Access-Jwt-Assertion': 'user@example.com'}
+    actions = make_actions(args.actions)
+    with TestClient(workout_app.app) as client:
+        client.get('/bodyweight', headers=headers)
+        event.listen(engine, 'before_cursor_execute', count)
+        for label in ('first replay', 'retry'):
+            statements = 0
+            start = time.perf_counter()
+            response = client.post('/api/sync', headers=headers, json={'actions': actions})
+            elapsed = time.perf_counter() - start
+            response.raise_for_status()
+            print(f'{label:<14} {elapsed * 1000:8.1f} ms  {statements:6} statements  '
+                  f'{response.json()["replayed"]:6} applied')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""Compare workout logging throughput with and without the write queue.
+
+Each mode runs in its own process against a scratch database: concurrent
+clients POST /exercises/ for several users through the real ASGI app, then a
+GET /api/sync per user checks every write landed. Reports logged exercises
+per second, request latency and how many transactions were committed.
+
+    python benchmarks/write_queue.py --requests 2000 --concurrency 32
+    DATABASE_ASYNC=1 python benchmarks/write_queue.py
+
+The queued mode's group commit latency can be tuned with WRITE_QUEUE_MAX_DELAY_MS
+and WRITE_QUEUE_MAX_BATCH as usual.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MOVEMENTS = ('Squat', 'Bench press', 'Pull-up', 'Dip')
+
+def run_mode(args) -> dict:
+    """Runs in a child process with WRITE_QUEUE already set."""
+    sys.path.insert(0, str(ROOT))
+    os.chdir(ROOT)
+    scratch = tempfile.mkdtemp()
+    os.environ['DATABASE_FILE'] = os.path.join(scratch, 'database.db')
+    os.environ.setdefault('CF_ACCESS_TEAM_DOMAIN', 'benchmark')
+    os.environ.setdefault('CF_ACCESS_AUD', 'benchmark')
+    os.environ['CF_ACCESS_CERTS_URL'] = os.path.join(scratch, 'certs.json')
+    Path(os.environ['CF_ACCESS_CERTS_URL']).write_text('{"keys": []}')
+
+    import httpx
+    from sqlalchemy import Engine, event
+
+    import app as workout_app
+    from auth import token_cache
+
+    def fake_verify(token: str) -> str:
+        token_cache.put(token, token, time.time() + 24 * 60 * 60)
+        return token
+
+    commits = 0
+
+    @event.listens_for(Engine, 'commit')
+    def count_commit(conn):
+        nonlocal commits
+        commits += 1
+
+    workout_app.verify_cf_access_token = fake_verify
+    # Lock waits in the direct mode would otherwise flood the output.
+    logging.getLogger('metrics').setLevel(logging.ERROR)
+
+    async def run() -> dict:
+        transport = httpx.ASGITransport(app=workout_app.app)
+        headers = [{'Cf-Access-Jwt-Assertion': f'user{i}@example.com'} for i in range(args.users)]
+        async with workout_app.app.router.lifespan_context(workout_app.app):
+            async with httpx.AsyncClient(transport=transport, base_url='http://benchmark') as client:
+                for user_headers in headers:
+                    await client.get('/bodyweight', headers=user_headers)
+
+                latencies: list[float] = []
+                errors = 0
+                remaining = args.requests
+
+                async def client_loop():
+                    nonlocal remaining, errors
+                    while remaining > 0:
+                        remaining -= 1
+                        start = time.perf_counter()
+                        response = await client.post('/exercises/', headers=headers[remaining % args.users], data={
+                            'exercise_name': MOVEMENTS[remaining % len(MOVEMENTS)],
+                            'reps': 5, 'weight': 100, 'rpe': 8,
+                        })
+                        latencies.append(time.perf_counter() - start)
+                        if response.status_code >= 400:
+                            errors += 1
+
+                nonlocal commits
+                commits = 0
+                start = time.perf_counter()
+                await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+                elapsed = time.perf_counter() - start
+                logged_commits = commits
+
+                # Reads wait for the user's queued writes, so this counts them all.
+                logged = 0
+                for user_headers in headers:
+                    response = await client.get('/api/sync', headers=user_headers)
+                    logged += len(response.json()['exercises'])
+
+        quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+        return {
+            'logged': logged,
+            'errors': errors,
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': quantiles[49] * 1000,
+            'p99_ms': quantiles[98] * 1000,
+            'commits': logged_commits,
+        }
+
+    return asyncio.run(run())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000, help='Exercises logged per mode')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args)))
+        return
+
+    print(f'{"mode":<8} {"logs/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"commits":>8} {"logged":>7} {"errors":>6}')
+    for mode, flag in (('direct', ''), ('queued', '1')):
+        child = subprocess.run(
+            [sys.executable, __file__, '--child', *sys.argv[1:]],
+            env={**os.environ, 'WRITE_QUEUE': flag}, capture_output=True, text=True,
+        )
+        if child.returncode:
+            sys.exit(f'{mode} run failed ({child.returncode}):\n{child.stderr}')
+        result = json.loads(child.stdout.splitlines()[-1])
+        print(f'{mode:<8} {result["throughput"]:8.0f} {result["p50_ms"]:8.2f} {result["p99_ms"]:8.2f} '
+              f'{result["commits"]:8d} {result["logged"]:7d} {result["errors"]:6d}')
+        if result['logged'] != args.requests:
+            sys.exit(f'{mode}: expected {args.requests} logged exercises, found {result["logged"]}')
+
+if __name__ == '__main__':
+    main()
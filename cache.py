@@ -0,0 +1,216 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from database import db_file_name
+
+ONEREPMAX_CACHE_SIZE = 4096
+BODYWEIGHT_CACHE_SIZE = 1024
+
+
+class LRUCache:
+    """Thread-safe bounded LRU map with hit/miss counters.
+
+    Writers call `set` or `invalidate` after committing. Readers that miss
+    load from the database and store the result with `fill`, passing the
+    `generation` they read before the lookup: if any write happened in
+    between, the possibly stale value is dropped instead of cached.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def fill(self, key: Hashable, value: Any, generation: int):
+        with self._lock:
+            if generation == self.generation:
+                self._store(key, value)
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self.generation += 1
+            self._store(key, value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+@dataclass(frozen=True)
+class MovementCatalogue:
+    # Highest sync version among movements; changes whenever one is written.
+    version: int
+    # name -> dip_belt, in name order
+    dip_belt: dict[str, bool]
+    # Rendered /movements <option> list and its ETag
+    options: str
+    etag: str
+
+
+class CatalogueCache:
+    """Holds one value, e.g. the whole movement catalogue, with the same
+    generation protocol as LRUCache: writers `invalidate` after committing
+    and readers `fill` with the generation read before loading.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._value: Any | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any | None:
+        # A plain attribute read is atomic, so hits don't take the lock.
+        value = self._value
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def fill(self, value: Any, generation: int):
+        with self._lock:
+            if generation == self.generation:
+                self._value = value
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._value = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': int(self._value is not None),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# (user id, movement name) -> (best external 1RM over the recommendation
+# lookback window, movement's dip_belt flag)
+onerepmax_cache = LRUCache(ONEREPMAX_CACHE_SIZE)
+# user id -> current bodyweight
+bodyweight_cache = LRUCache(BODYWEIGHT_CACHE_SIZE)
+# MovementCatalogue of every movement
+movement_cache = CatalogueCache()
+
+
+class ChangeCounter:
+    """A counter shared by every process using the database, kept in a
+    memory-mapped file next to it.
+
+    Processes `publish` after committing a change that cached data may depend
+    on. Each request calls `check`, which costs one read from shared memory
+    and runs `on_change` when another process has published since.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.seen: int | None = None
+        self._fd: int | None = None
+        self._map: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    def _value(self) -> int:
+        if self._map is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size < 8:
+                os.ftruncate(self._fd, 8)
+            self._map = mmap.mmap(self._fd, 8)
+        return struct.unpack_from('<Q', self._map)[0]
+
+    def check(self, on_change: Callable[[], None]):
+        with self._lock:
+            value = self._value()
+            if value != self.seen:
+                if self.seen is not None:
+                    on_change()
+                self.seen = value
+
+    def publish(self):
+        with self._lock:
+            self._value()  # Opens the file on first use
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                value = self._value()
+                struct.pack_into('<Q', self._map, 0, value + 1)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            # Our own change needs no clearing, unless another process's
+            # change is also pending; then leave it for the next check.
+            if value == self.seen:
+                self.seen = value + 1
+
+
+change_counter = ChangeCounter(f'{db_file_name}-changes')
+
+
+def clear_caches():
+    onerepmax_cache.clear()
+    bodyweight_cache.clear()
+    movement_cache.invalidate()
+
+
+def sync_caches():
+    """Drop cached data if another worker process committed changes since the last request."""
+    change_counter.check(clear_caches)
+
+
+# next_sync_version flags every transaction that writes users, movements or
+# exercises; once it commits, other processes are told to drop their caches.
+@event.listens_for(Session, 'after_commit')
+def publish_changes(session):
+    if session.info.pop('synced_changes', False):
+        change_counter.publish()
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_changes(session):
+    session.info.pop('synced_changes', None)
@@ -1,13 +1,129 @@
-from models import Movement, User
+import fcntl
+import os
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 
-from sqlmodel import Session, SQLModel, create_engine, select
+from models import DailyBest, Exercise, ExerciseArchive, Movement, ReplayedAction, SyncState, Tombstone, User
 
-db_file_name = '/app/data/database.db'
+from sqlalchemy import Engine, event, insert, inspect, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from sqlmodel import Session, SQLModel, create_engine, delete, func, select
+
+db_file_name = os.environ.get('DATABASE_FILE', '/app/data/database.db')
 db_url = f'sqlite:///{db_file_name}'
-engine = create_engine(db_url, echo=True, connect_args={'check_same_thread': False})
+
+def env_flag(name: str) -> bool:
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes')
+
+# Log every SQL statement. Off unless debugging: echo writes synchronously to stdout.
+DEBUG = env_flag('DEBUG')
+
+# 'performance' applies SQLITE_PRAGMAS to every connection; 'default' keeps
+# SQLite's stock settings (rollback journal, synchronous=FULL).
+DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE', 'performance')
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 10))
+
+SQLITE_PRAGMAS = {
+    # Readers no longer block on writers and commits append to the WAL.
+    'journal_mode': 'WAL',
+    # Safe with WAL: a power loss can drop the last commits but not corrupt.
+    'synchronous': 'NORMAL',
+    # Wait for the write lock instead of failing with "database is locked".
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # In KiB
+    'temp_store': 'MEMORY',
+}
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+def create_db_engine(url: str, profile: str = DATABASE_PROFILE) -> Engine:
+    engine = create_engine(
+        url,
+        echo=DEBUG,
+        connect_args={'check_same_thread': False},
+        poolclass=QueuePool,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=2 * DATABASE_POOL_SIZE,
+    )
+    if profile == 'performance':
+        event.listen(engine, 'connect', set_sqlite_pragmas)
+    return engine
+
+engine = create_db_engine(db_url)
+
+# When enabled, routes run on the event loop over aiosqlite instead of in
+# Starlette's threadpool. The sync engine is still used at startup.
+ASYNC_DATABASE = env_flag('DATABASE_ASYNC')
+async_engine = create_async_engine(f'sqlite+aiosqlite:///{db_file_name}', echo=DEBUG) if ASYNC_DATABASE else None
+if async_engine and DATABASE_PROFILE == 'performance':
+    event.listen(async_engine.sync_engine, 'connect', set_sqlite_pragmas)
+
+# Tombstones older than this are pruned by maintain_db. Clients whose sync cursor
+# predates the pruned range fall back to a full resync.
+TOMBSTONE_RETENTION = timedelta(days=90)
+# How long replayed offline action ids are remembered to deduplicate retries.
+REPLAY_LOG_RETENTION = timedelta(days=30)
+# Exercises logged more than this many days ago are moved to exercisearchive.
+# Unset keeps every exercise in the hot table.
+ARCHIVE_AFTER = timedelta(days=int(os.environ['ARCHIVE_AFTER_DAYS'])) if os.environ.get('ARCHIVE_AFTER_DAYS') else None
+# Most rows moved per archive transaction, bounding how long writers wait.
+ARCHIVE_BATCH_SIZE = 5000
+# How often maintain_db runs once the app is up.
+MAINTENANCE_INTERVAL = timedelta(days=1)
+
+SYNCED_MODELS = (Exercise, Movement, User)
+
+def next_sync_version(session: Session) -> int:
+    '''Allocate a new sync version within the session's transaction.
+
+    Used directly by bulk inserts, which bypass the before_flush hook below.
+    Also flags the session so other worker processes drop their caches once
+    it commits.
+    '''
+    session.info['synced_changes'] = True
+    return session.connection().execute(
+        update(SyncState)
+        .where(SyncState.id == 1)
+        .values(version=SyncState.version + 1)
+        .returning(SyncState.version)
+    ).scalar_one()
+
+@event.listens_for(Session, 'before_flush')
+def stamp_sync_version(session, flush_context, instances):
+    '''Stamp changed rows with a new sync version and record deleted exercises.
+
+    The version comes from a single UPDATE ... RETURNING on syncstate, which
+    takes SQLite's write lock, so versions are handed out in commit order and
+    a client cursor never skips over a transaction that commits later.
+    '''
+    changed = [
+        obj for obj in session.new | session.dirty
+        if isinstance(obj, SYNCED_MODELS) and session.is_modified(obj)
+    ]
+    deleted = [obj for obj in session.deleted if isinstance(obj, (Exercise, ExerciseArchive))]
+    if not changed and not deleted:
+        return
+
+    version = next_sync_version(session)
+    for obj in changed:
+        obj.version = version
+    for exercise in deleted:
+        session.add(Tombstone(exercise_id=exercise.id, user_id=exercise.user_id, version=version))
 
 def seed_db():
     with Session(engine) as session:
+        if not session.get(SyncState, 1):
+            session.add(SyncState())
+            session.commit()
+
         existing = session.exec(select(Movement)).first()
         if existing:
             print('Database already seeded')
@@ -24,6 +140,200 @@ def seed_db():
         session.commit()
         print(f'Added {len(movements)} movements')
 
+def rebuild_table(table, existing: set[str]):
+    '''Recreate a table from its model and copy its rows over, in one transaction.
+
+    For changes SQLite can't make in place, such as adding AUTOINCREMENT.
+    Columns missing from the old table get their server defaults.
+    '''
+    columns = ', '.join(column.name for column in table.columns if column.name in existing)
+    with engine.begin() as connection:
+        # pysqlite doesn't open a transaction for DDL on its own.
+        connection.exec_driver_sql('BEGIN')
+        for index in inspect(connection).get_indexes(table.name):
+            connection.exec_driver_sql(f'DROP INDEX {index["name"]}')
+        connection.exec_driver_sql(f'ALTER TABLE {table.name} RENAME TO {table.name}_old')
+        table.create(connection)
+        connection.exec_driver_sql(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old')
+        connection.exec_driver_sql(f'DROP TABLE {table.name}_old')
+
+def migrate_db() -> set[str]:
+    '''Bring a database created by an older version up to the current schema.
+
+    Missing columns are added with their server defaults and missing indexes
+    are created. Tables that need AUTOINCREMENT are rebuilt. New tables are
+    left to create_all. Returns the added columns and the new or rebuilt
+    tables as 'table.column' and 'table' names so callers can backfill them.
+    '''
+    added = set()
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        if not table.dialect_options['sqlite']['autoincrement'] or not inspector.has_table(table.name):
+            continue
+        with engine.connect() as connection:
+            ddl = connection.exec_driver_sql('SELECT sql FROM sqlite_master WHERE name = ?', (table.name,)).scalar()
+        if 'AUTOINCREMENT' in ddl.upper():
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        added.add(table.name)
+        added.update(f'{table.name}.{column.name}' for column in table.columns if column.name not in existing)
+        rebuild_table(table, existing)
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                added.add(table.name)
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+                    added.add(f'{table.name}.{column.name}')
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    return added
+
+def backfill_db(added: set[str]):
+    '''Populate derived data for columns and tables added by migrate_db.'''
+    with engine.begin() as connection:
+        if 'exercise' in added:
+            # Start new ids above any an exercise has had, including deleted
+            # and archived ones.
+            connection.exec_driver_sql('''
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT 'exercise', 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'exercise')
+            ''')
+            connection.exec_driver_sql('''
+                UPDATE sqlite_sequence
+                SET seq = MAX(
+                    seq,
+                    (SELECT COALESCE(MAX(id), 0) FROM exercise),
+                    (SELECT COALESCE(MAX(id), 0) FROM exercisearchive),
+                    (SELECT COALESCE(MAX(exercise_id), 0) FROM tombstone)
+                )
+                WHERE name = 'exercise'
+            ''')
+        if 'exercise.onerepmax' in added:
+            # Same formula as get_onerepmax in app.py.
+            connection.exec_driver_sql('''
+                UPDATE exercise
+                SET onerepmax = (weight + COALESCE(bodyweight, 0)) * 36 / (37 - (reps + (10 - rpe)))
+                                - COALESCE(bodyweight, 0)
+            ''')
+        if 'dailybest' in added:
+            connection.exec_driver_sql('''
+                INSERT INTO dailybest (user_id, exercise_name, day, onerepmax)
+                SELECT user_id, exercise_name, date(created_at), MAX(onerepmax)
+                FROM exercise
+                GROUP BY user_id, exercise_name, date(created_at)
+            ''')
+
+def prune_tombstones():
+    '''Delete tombstones older than TOMBSTONE_RETENTION and raise the sync floor.'''
+    cutoff = datetime.now(timezone.utc) - TOMBSTONE_RETENTION
+    with Session(engine) as session:
+        floor = session.exec(select(func.max(Tombstone.version)).where(Tombstone.deleted_at < cutoff)).one()
+        if floor is None:
+            return
+        session.exec(delete(Tombstone).where(Tombstone.version <= floor))
+        state = session.get(SyncState, 1)
+        state.tombstone_floor = max(state.tombstone_floor, floor)
+        session.add(state)
+        session.commit()
+
+def prune_replay_log():
+    '''Forget replayed action ids older than REPLAY_LOG_RETENTION.'''
+    cutoff = datetime.now(timezone.utc) - REPLAY_LOG_RETENTION
+    with Session(engine) as session:
+        session.exec(delete(ReplayedAction).where(ReplayedAction.replayed_at < cutoff))
+        session.commit()
+
+def archive_exercises(horizon: timedelta, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    '''Move exercises logged before the horizon from exercise to exercisearchive.
+
+    The cutoff is rounded down to midnight UTC so a day's exercises leave
+    together. Each user's rows move oldest first in batches that are copied
+    and deleted in one transaction, so readers always find a row in exactly
+    one of the tables. DailyBest rows are left alone. Returns the number of
+    rows moved.
+    '''
+    cutoff = datetime.combine(datetime.now(timezone.utc).date() - horizon, datetime.min.time())
+    columns = [column.name for column in ExerciseArchive.__table__.columns]
+    with engine.connect() as connection:
+        user_ids = connection.execute(select(User.id)).scalars().all()
+
+    moved = 0
+    for user_id in user_ids:
+        archivable = (Exercise.user_id == user_id, Exercise.created_at < cutoff)
+        while True:
+            with engine.begin() as connection:
+                last = connection.execute(
+                    select(Exercise.created_at)
+                    .where(*archivable)
+                    .order_by(Exercise.created_at)
+                    .offset(batch_size - 1)
+                    .limit(1)
+                ).scalar()
+                batch = archivable if last is None else (*archivable, Exercise.created_at <= last)
+                connection.execute(
+                    insert(ExerciseArchive).from_select(
+                        columns, select(*(Exercise.__table__.c[name] for name in columns)).where(*batch)
+                    )
+                )
+                moved += connection.execute(delete(Exercise).where(*batch)).rowcount
+            if last is None:
+                break
+    return moved
+
+def schema_version() -> int:
+    '''Fingerprint of the schema the models describe.
+
+    Stored in SQLite's user_version once a database has been migrated and
+    seeded, so later startups can tell it is current without inspecting it.
+    '''
+    ddl = []
+    for table in SQLModel.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            ddl.append(str(CreateIndex(index).compile(dialect=engine.dialect)))
+    # user_version is a signed 32-bit integer, and 0 is a new database.
+    return zlib.crc32('\n'.join(ddl).encode()) & 0x7fffffff or 1
+
+@contextmanager
+def startup_lock():
+    '''Serialize schema setup when several worker processes start at once.'''
+    with open(f'{db_file_name}-startup.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
-    seed_db()
+    '''Create, migrate and seed the database unless it is already current.'''
+    version = schema_version()
+    with startup_lock():
+        with engine.connect() as connection:
+            if connection.exec_driver_sql('PRAGMA user_version').scalar_one() == version:
+                return
+        added = migrate_db()
+        SQLModel.metadata.create_all(engine)
+        backfill_db(added)
+        seed_db()
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f'PRAGMA user_version = {version}')
+
+def database_ready() -> bool:
+    try:
+        with engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+        return True
+    except Exception:
+        return False
+
+def maintain_db():
+    '''Housekeeping that doesn't need to hold up startup, repeated every MAINTENANCE_INTERVAL.'''
+    prune_tombstones()
+    prune_replay_log()
+    if ARCHIVE_AFTER is not None:
+        moved = archive_exercises(ARCHIVE_AFTER)
+        if moved:
+            print(f'Archived {moved} exercises')
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterable
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their SQL and route.
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', 100)) / 1000
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+JWT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Prometheus-style histogram with fixed upper bounds, one series per label set."""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float]):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, +Inf last), sum]
+        self._series: dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(series):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", le),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {total:.6f}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def expose(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f'{self.name}{format_labels(labels)} {value:g}' for labels, value in values)
+        return lines
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (
+        name + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in labels
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+request_duration = Histogram('http_request_duration_seconds', 'Request latency by route.', LATENCY_BUCKETS)
+requests_total = Counter('http_requests_total', 'Requests by route and status code.')
+request_queries = Histogram('http_request_db_queries', 'SQL statements executed per request.', QUERY_COUNT_BUCKETS)
+query_seconds = Counter('db_query_seconds_total', 'Cumulative SQL execution time by route.')
+queries_total = Counter('db_queries_total', 'SQL statements executed by route.')
+slow_queries = Counter('db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS by route.')
+query_errors = Counter('db_query_errors_total', 'SQL statements that raised by route.')
+jwt_verify_duration = Histogram('jwt_verify_duration_seconds', 'Cloudflare Access JWT verification time.', JWT_BUCKETS)
+write_batch_size = Histogram('write_queue_batch_size', 'Writes committed per write-queue transaction.', BATCH_SIZE_BUCKETS)
+
+REGISTRY = (
+    request_duration, requests_total, request_queries, query_seconds, queries_total, slow_queries, query_errors,
+    jwt_verify_duration, write_batch_size,
+)
+
+
+def expose() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    return '\n'.join(line for metric in REGISTRY for line in metric.expose()) + '\n'
+
+
+@dataclass
+class RequestStats:
+    scope: dict
+    queries: int = 0
+    query_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        # Routing stores the matched route in the scope, so this is known by
+        # the time the endpoint runs queries.
+        route = self.scope.get('route')
+        return getattr(route, 'path', 'unmatched')
+
+
+# Set for the duration of each HTTP request. Starlette copies the context into
+# threadpool workers and streaming iterators, so queries issued there are
+# attributed to the request that caused them.
+current_request: ContextVar[RequestStats | None] = ContextVar('current_request', default=None)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    observe_query(time.perf_counter() - conn.info['query_start'].pop(), statement)
+
+
+@event.listens_for(Engine, 'handle_error')
+def record_failed_query(context):
+    # after_cursor_execute doesn't run when the statement raises, so pop its
+    # timer here; otherwise it stays on the pooled connection. Errors outside
+    # a statement (connect, commit) have no timer to pop.
+    conn = context.connection
+    starts = conn.info.get('query_start') if conn is not None else None
+    if context.statement is None or not starts:
+        return
+    observe_query(time.perf_counter() - starts.pop(), context.statement, failed=True)
+
+
+def observe_query(elapsed: float, statement: str, failed: bool = False):
+    stats = current_request.get()
+    route = stats.route if stats else 'background'
+    if failed:
+        query_errors.inc(route=route)
+    if stats:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    else:
+        queries_total.inc(route=route)
+        query_seconds.inc(elapsed, route=route)
+    if elapsed >= SLOW_QUERY_SECONDS:
+        slow_queries.inc(route=route)
+        logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000, route, ' '.join(statement.split()))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request until its last body chunk is sent.
+
+    Latency, status and the SQL counted by the engine hooks above are recorded
+    under the matched route's path template, e.g. /exercises/{exercise_id}/delete.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_and_record(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_record)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            route = stats.route
+            labels = {'method': scope['method'], 'route': route}
+            request_duration.observe(elapsed, **labels)
+            requests_total.inc(**labels, status=str(status))
+            request_queries.observe(stats.queries, **labels)
+            queries_total.inc(stats.queries, route=route)
+            query_seconds.inc(stats.query_seconds, route=route)
@@ -1,9 +1,11 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 class Movement(SQLModel, table=True):
     name: str = Field(primary_key=True)
     dip_belt: bool = Field(default=False)
+    version: int = Field(default=0, sa_column_kwargs={'server_default': '0'}) # Sync version of the last change
 
 class ExerciseBase(SQLModel):
     exercise_name: str = Field(index=True, foreign_key='movement.name')
@@ -16,10 +18,43 @@ class ExerciseCreate(ExerciseBase):
     pass
 
 class Exercise(ExerciseBase, table=True):
+    # Every per-user query filters on user_id (and usually exercise_name) and
+    # orders by created_at; these let SQLite answer them without a sort.
+    # AUTOINCREMENT keeps SQLite from handing a deleted exercise's id to the
+    # next one, which would clash with its tombstone.
+    __table_args__ = (
+        Index('ix_exercise_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_exercise_user_id_exercise_name_created_at', 'user_id', 'exercise_name', 'created_at'),
+        Index('ix_exercise_user_id_version', 'user_id', 'version'),
+        {'sqlite_autoincrement': True},
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key='user.id')
     bodyweight: float | None # Only set for movements with dip_belt=True
+    onerepmax: float | None = None # Estimated external 1RM, computed at write time
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = Field(default=0, sa_column_kwargs={'server_default': '0'}) # Sync version of the last change
+
+class ExerciseArchive(SQLModel, table=True):
+    '''Exercises moved out of the hot table by archive_exercises.
+
+    Archived rows are read by user and date range, so they are clustered on
+    that key (WITHOUT ROWID) and carry no secondary indexes or sync version.
+    Their daily bests stay in DailyBest.
+    '''
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    user_id: int = Field(primary_key=True, foreign_key='user.id')
+    created_at: datetime = Field(primary_key=True)
+    id: int = Field(primary_key=True) # Keeps its Exercise id
+    exercise_name: str = Field(foreign_key='movement.name')
+    sets: int
+    reps: int
+    weight: float
+    rpe: float
+    bodyweight: float | None
+    onerepmax: float | None
 
 class ExercisePublic(ExerciseBase):
     id: int
@@ -30,3 +65,44 @@ class User(SQLModel, table=True):
     email: str = Field(unique=True)
     bodyweight: float = Field(default=70) # In kg
     is_admin: bool = Field(default=False)
+    version: int = Field(default=0, sa_column_kwargs={'server_default': '0'}) # Sync version of the last change
+
+class DailyBest(SQLModel, table=True):
+    '''Best estimated external 1RM per user, movement and day.
+
+    Maintained alongside Exercise writes so progress charts read one row per
+    day instead of recomputing 1RMs over every logged set.
+    '''
+    user_id: int = Field(primary_key=True, foreign_key='user.id')
+    exercise_name: str = Field(primary_key=True, foreign_key='movement.name')
+    day: date = Field(primary_key=True)
+    onerepmax: float
+
+class Tombstone(SQLModel, table=True):
+    '''Records a deleted exercise so incremental syncs can remove it from clients.'''
+    __table_args__ = (
+        Index('ix_tombstone_user_id_version', 'user_id', 'version'),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    exercise_id: int
+    user_id: int
+    version: int
+    deleted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ReplayedAction(SQLModel, table=True):
+    '''Client-supplied ids of offline actions already applied by POST /api/sync.'''
+    user_id: int = Field(primary_key=True, foreign_key='user.id')
+    action_id: str = Field(primary_key=True)
+    replayed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+
+class SyncState(SQLModel, table=True):
+    '''Single-row table holding the global change sequence used by /api/sync.
+
+    version: incremented once per flush that touches a synced row.
+    tombstone_floor: highest version whose tombstones were pruned; cursors
+    older than this can no longer be served incrementally.
+    '''
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0)
+    tombstone_floor: int = Field(default=0)
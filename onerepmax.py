@@ -0,0 +1,39 @@
+"""Vectorized Brzycki 1RM and target-weight math.
+
+Array counterparts of get_onerepmax and get_target_weight in app.py, for
+computing many values in one pass (recommendation grids, bulk replays).
+All arguments broadcast against each other. Bodyweight is only meaningful for
+dip-belt movements; pass 0 or NaN elsewhere.
+"""
+import numpy as np
+from numpy.typing import ArrayLike
+
+
+def _bodyweight(bodyweight: ArrayLike) -> np.ndarray:
+    return np.nan_to_num(np.asarray(bodyweight, dtype=float))
+
+
+def estimate_onerepmax(weight: ArrayLike, reps: ArrayLike, rpe: ArrayLike, bodyweight: ArrayLike = 0) -> np.ndarray:
+    '''Estimate external 1RMs (excluding bodyweight).'''
+    bw = _bodyweight(bodyweight)
+    reps_in_reserve = 10 - np.asarray(rpe, dtype=float)
+    return (np.asarray(weight, dtype=float) + bw) * 36 / (37 - (np.asarray(reps) + reps_in_reserve)) - bw
+
+
+def target_weights(onerepmax: ArrayLike, reps: ArrayLike, rpe: ArrayLike, bodyweight: ArrayLike, plate: float) -> np.ndarray:
+    '''External weights for target reps/RPE, rounded to the nearest multiple of `plate`.'''
+    bw = _bodyweight(bodyweight)
+    target_r = np.asarray(reps) + (10 - np.asarray(rpe, dtype=float))
+    weight = (np.asarray(onerepmax, dtype=float) + bw) * (37 - target_r) / 36 - bw
+    return np.round(weight / plate) * plate
+
+
+def recommendation_grid(onerepmax: float, bodyweight: float | None, reps: ArrayLike, rpe: ArrayLike, plate: float) -> np.ndarray:
+    '''Target weights for every reps x RPE combination, shaped (len(reps), len(rpe)).'''
+    return target_weights(
+        onerepmax,
+        np.asarray(reps)[:, np.newaxis],
+        np.asarray(rpe)[np.newaxis, :],
+        bodyweight if bodyweight else 0,
+        plate,
+    )
@@ -0,0 +1,75 @@
+import gzip
+import hashlib
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+from database import DEBUG
+
+try:
+    import brotli
+except ImportError:  # Optional: pages are also served gzip-compressed
+    brotli = None
+
+INDEX_PATH = Path(__file__).parent / 'index.html'
+
+ADMIN_ONLY_SECTIONS = re.compile(r'<!-- BEGIN Create Movement -->.*?<!-- END Create Movement -->', re.DOTALL)
+
+
+@dataclass
+class RenderedPage:
+    # Encoded bodies keyed by content coding ('identity', 'gzip', 'br').
+    bodies: dict[str, bytes]
+    etag: str
+
+    def negotiate(self, accept_encoding: str) -> str:
+        accepted = {coding.split(';')[0].strip() for coding in accept_encoding.lower().split(',')}
+        for coding in ('br', 'gzip'):
+            if coding in accepted and coding in self.bodies:
+                return coding
+        return 'identity'
+
+    def etag_for(self, coding: str) -> str:
+        # Strong ETags identify exact bytes, so each encoding gets its own.
+        return self.etag if coding == 'identity' else f'"{self.etag.strip(chr(34))}-{coding}"'
+
+
+def render_page(html: str) -> RenderedPage:
+    body = html.encode()
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli:
+        bodies['br'] = brotli.compress(body)
+    return RenderedPage(bodies=bodies, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+class IndexPages:
+    """index.html pre-rendered once per role, with compressed variants.
+
+    Non-admins get the page without the admin-only sections. In DEBUG mode
+    the file is re-read whenever its modification time changes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._mtime: float | None = None
+        self._pages: dict[bool, RenderedPage] = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        mtime = self.path.stat().st_mtime
+        html = self.path.read_text()
+        pages = {
+            True: render_page(html),
+            False: render_page(ADMIN_ONLY_SECTIONS.sub('', html)),
+        }
+        with self._lock:
+            self._pages, self._mtime = pages, mtime
+
+    def get(self, is_admin: bool) -> RenderedPage:
+        if not self._pages or DEBUG and self.path.stat().st_mtime != self._mtime:
+            self.load()
+        return self._pages[is_admin]
+
+
+index_pages = IndexPages(INDEX_PATH)
@@ -0,0 +1,81 @@
+"""Single-pass transforms over date-ordered (day, value) series for /progress."""
+from collections import deque
+from collections.abc import Iterable, Iterator
+from datetime import date, timedelta
+from typing import Literal
+
+Point = tuple[date, float]
+Period = Literal['daily', 'weekly', 'monthly']
+
+
+def period_start(day: date, period: Period) -> date:
+    if period == 'weekly':
+        return day - timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    return day
+
+
+def best_per_period(points: Iterable[Point], period: Period) -> Iterator[Point]:
+    '''Keep the best value per week or month, dated at the start of the period.'''
+    if period == 'daily':
+        yield from points
+        return
+    current, best = None, None
+    for day, value in points:
+        start = period_start(day, period)
+        if start != current:
+            if current is not None:
+                yield current, best
+            current, best = start, value
+        elif value > best:
+            best = value
+    if current is not None:
+        yield current, best
+
+
+def moving_average(points: Iterable[Point], window: int) -> Iterator[Point]:
+    '''Trailing mean over the last `window` points.'''
+    values: deque[float] = deque(maxlen=window)
+    total = 0.0
+    for day, value in points:
+        if len(values) == window:
+            total -= values[0]
+        values.append(value)
+        total += value
+        yield day, total / len(values)
+
+
+def downsample(points: list[Point], threshold: int) -> list[Point]:
+    '''Reduce a series to `threshold` points with Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each bucket in between, the one
+    forming the largest triangle with the previously kept point and the next
+    bucket's average, which preserves peaks and troughs far better than
+    taking every n-th point.
+    '''
+    if threshold >= len(points) or threshold < 3:
+        return points
+
+    xs = [day.toordinal() for day, _ in points]
+    ys = [value for _, value in points]
+    every = (len(points) - 2) / (threshold - 2)
+    sampled = [points[0]]
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_start = min(end, len(points) - 1)
+        avg_x = sum(xs[next_start:next_end]) / max(next_end - next_start, 1)
+        avg_y = sum(ys[next_start:next_end]) / max(next_end - next_start, 1)
+
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
@@ -64,6 +64,33 @@ function getAll(db, storeName) {
     });
 }
 
+function getOne(db, storeName, key) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(storeName, 'readonly');
+        const store = tx.objectStore(storeName);
+        const request = store.get(key);
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function applyDelta(db, storeName, items, deletedKeys) {
+    return new Promise((resolve, reject) => {
+        const tx = db.transaction(storeName, 'readwrite');
+        const store = tx.objectStore(storeName);
+        // Deletes first: a key deleted and then reused by a newer row must
+        // end up holding that row.
+        for (const key of deletedKeys) {
+            store.delete(key);
+        }
+        for (const item of items) {
+            store.put(item);
+        }
+        tx.oncomplete = () => resolve();
+        tx.onerror = () => reject(tx.error);
+    });
+}
+
 function clearStore(db, storeName) {
     return new Promise((resolve, reject) => {
         const tx = db.transaction(storeName, 'readwrite');
@@ -90,8 +117,20 @@ async function replayPendingActions() {
     });
 
     if (response.ok) {
-        await clearStore(db, 'pending');
-        console.log('[offline] Pending actions replayed successfully');
+        // Results come back in the order the actions were sent. Keep the ones
+        // that failed: they are retried on the next sync, e.g. a set logged
+        // for a movement that hasn't been created yet.
+        const { results } = await response.json();
+        const settled = [];
+        results.forEach((result, i) => {
+            if (result.status === 'error') {
+                console.warn('[offline] Pending action failed, keeping it queued:', pending[i], result.detail);
+            } else {
+                settled.push(pending[i].id);
+            }
+        });
+        await applyDelta(db, 'pending', [], settled);
+        console.log(`[offline] Replayed ${settled.length} of ${pending.length} pending action(s)`);
     } else {
         console.error('[offline] Failed to replay pending actions:', response.status);
     }
@@ -104,16 +143,36 @@ async function syncData() {
         // First, replay any pending offline writes
         await replayPendingActions();
 
-        // Then pull fresh data from the server
-        const response = await fetch('/api/sync');
+        // Then pull what changed since the last sync from the server
+        const db = await openDB();
+        const cursor = await getOne(db, 'user', 'sync_cursor');
+        const url = cursor ? `/api/sync?since=${cursor.value}` : '/api/sync';
+        const response = await fetch(url);
         if (!response.ok) return;
 
         const data = await response.json();
-        const db = await openDB();
 
-        await putAll(db, 'movements', data.movements);
-        await putAll(db, 'exercises', data.exercises);
-        await putOne(db, 'user', { key: 'bodyweight', value: data.bodyweight });
+        if (data.full) {
+            await putAll(db, 'movements', data.movements);
+            await putAll(db, 'exercises', data.exercises);
+        } else {
+            // Exercises logged offline are now on the server under their real
+            // ids, so drop the local placeholders of those no longer pending.
+            // Entries queued before placeholder_id was recorded can't be
+            // matched, so every placeholder waits for those.
+            const pending = await getAll(db, 'pending');
+            const waiting = new Set(pending.map((p) => p.placeholder_id));
+            const unmatched = pending.some((p) => p.type === 'create_exercise' && !p.placeholder_id);
+            const placeholders = unmatched ? [] : (await getAll(db, 'exercises'))
+                .filter((e) => String(e.id).startsWith('offline_') && !waiting.has(e.id))
+                .map((e) => e.id);
+            await applyDelta(db, 'movements', data.movements, []);
+            await applyDelta(db, 'exercises', data.exercises, [...data.deleted_exercises, ...placeholders]);
+        }
+        if ('bodyweight' in data) {
+            await putOne(db, 'user', { key: 'bodyweight', value: data.bodyweight });
+        }
+        await putOne(db, 'user', { key: 'sync_cursor', value: data.cursor });
 
         console.log('[offline] Synced data to IndexedDB');
     } catch (e) {
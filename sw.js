@@ -166,9 +166,8 @@ async function generateOfflineResponse(url) {
             return generateMovementsResponse(db);
         }
         if (url.pathname === '/exercises') {
-            const offset = parseInt(url.searchParams.get('offset') || '0');
             const limit = parseInt(url.searchParams.get('limit') || '5');
-            return generateExercisesResponse(db, offset, limit);
+            return generateExercisesResponse(db, url.searchParams, limit);
         }
         if (url.pathname === '/bodyweight') {
             return generateBodyweightResponse(db);
@@ -190,11 +189,25 @@ async function generateMovementsResponse(db) {
     return htmlResponse(options.join('\n'));
 }
 
-async function generateExercisesResponse(db, offset, limit) {
+// Keyset cursors from the server look like "<created_at>,<id>"; offline we
+// just locate the referenced row in the sorted list.
+function cursorIndex(exercises, cursor) {
+    const id = cursor.slice(cursor.lastIndexOf(',') + 1);
+    return exercises.findIndex((e) => String(e.id) === id);
+}
+
+async function generateExercisesResponse(db, params, limit) {
     const exercises = await getAll(db, 'exercises');
     // Sort descending by created_at
     exercises.sort((a, b) => new Date(b.created_at) - new Date(a.created_at));
 
+    let offset = parseInt(params.get('offset') || '0');
+    if (params.get('before')) {
+        offset = cursorIndex(exercises, params.get('before')) + 1;
+    } else if (params.get('after')) {
+        offset = Math.max(cursorIndex(exercises, params.get('after')) - limit, 0);
+    }
+
     const page = exercises.slice(offset, offset + limit);
     const hasNext = exercises.length > offset + limit;
     const hasPrev = offset > 0;
@@ -284,7 +297,9 @@ function addItem(db, storeName, item) {
 }
 
 function queuePending(db, action) {
-    return addItem(db, 'pending', action);
+    // The server remembers action ids it has replayed, so resending a batch
+    // after a dropped response does not log anything twice.
+    return addItem(db, 'pending', { action_id: crypto.randomUUID(), ...action });
 }
 
 async function handleOfflineWrite(url, method, body) {
@@ -335,6 +350,8 @@ async function handleOfflineCreateExercise(db, form) {
             rpe: exercise.rpe,
         },
         created_at: exercise.created_at,
+        // Lets the page drop the placeholder once the server has the exercise.
+        placeholder_id: exercise.id,
     });
 
     return htmlResponse('<div><p>Exercise logged</p></div>');
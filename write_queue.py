@@ -0,0 +1,141 @@
+import logging
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from database import engine, env_flag
+from metrics import write_batch_size
+
+logger = logging.getLogger(__name__)
+
+# Write-behind mode: workout writes are acknowledged once queued and
+# committed in groups by a single writer thread.
+WRITE_QUEUE = env_flag('WRITE_QUEUE')
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get('WRITE_QUEUE_MAX_BATCH', 100))
+# How long the writer lingers for more writes after the first one arrives.
+WRITE_QUEUE_MAX_DELAY = float(os.environ.get('WRITE_QUEUE_MAX_DELAY_MS', 5)) / 1000
+
+
+@dataclass
+class PendingWrite:
+    user_id: int
+    # Adds the change to the writer's session without committing. Runs again
+    # in its own transaction if its batch fails, so it must build any ORM
+    # objects itself.
+    apply: Callable[[Session], None]
+    # Runs after the change is committed, e.g. to invalidate caches.
+    on_commit: Callable[[], None] | None
+    future: Future
+
+
+class WriteQueue:
+    """Group commit for writes from many requests.
+
+    `submit` queues a write and returns a future that resolves once it is
+    committed. The writer thread takes everything queued (up to max_batch,
+    waiting at most max_delay for stragglers) and commits it in a single
+    transaction, so a busy minute costs a handful of fsyncs and write-lock
+    acquisitions instead of one per request. If the batch fails, each write
+    is retried alone so one bad write can't take the others down.
+
+    Writes are applied in submission order. `pending` returns the last write
+    a user submitted; waiting on it makes that user's earlier writes visible.
+    """
+
+    def __init__(self, engine: Engine, max_batch: int, max_delay: float):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue[PendingWrite | None] = queue.Queue()
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='write-queue', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Commit everything queued so far, then stop the writer."""
+        if self._thread:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, user_id: int, apply: Callable[[Session], None], on_commit: Callable[[], None] | None = None) -> Future:
+        future = Future()
+        with self._lock:
+            self._pending[user_id] = future
+        self._queue.put(PendingWrite(user_id, apply, on_commit, future))
+        return future
+
+    def pending(self, user_id: int) -> Future | None:
+        return self._pending.get(user_id)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    write = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            self._commit(batch)
+
+    def _commit(self, batch: list[PendingWrite]):
+        try:
+            with Session(self.engine) as session:
+                # One flush at commit stamps the whole batch with a single
+                # sync version; writes that read back what they changed
+                # flush themselves.
+                with session.no_autoflush:
+                    for write in batch:
+                        write.apply(session)
+                session.commit()
+            write_batch_size.observe(len(batch))
+            for write in batch:
+                self._done(write, None)
+        except Exception as error:
+            if len(batch) == 1:
+                # Expected failures like a 404 reach the request that queued
+                # the write; anything else is worth a log line.
+                if not isinstance(error, HTTPException):
+                    logger.exception('Queued write for user %s failed', batch[0].user_id)
+                self._done(batch[0], error)
+                return
+            for write in batch:
+                self._commit([write])
+
+    def _done(self, write: PendingWrite, error: BaseException | None):
+        if error is None and write.on_commit:
+            try:
+                write.on_commit()
+            except Exception:
+                logger.exception('Post-commit hook for user %s failed', write.user_id)
+        with self._lock:
+            if self._pending.get(write.user_id) is write.future:
+                del self._pending[write.user_id]
+        if error is None:
+            write.future.set_result(None)
+        else:
+            write.future.set_exception(error)
+
+
+write_queue = WriteQueue(engine, WRITE_QUEUE_MAX_BATCH, WRITE_QUEUE_MAX_DELAY) if WRITE_QUEUE else None